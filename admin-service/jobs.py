@@ -0,0 +1,308 @@
+"""SQLite-backed job queue for slow admin operations.
+
+The web process only enqueues jobs and reads their status; separate worker
+processes claim queued jobs, run them and report progress. A running job
+is cancelled cooperatively the next time it reports progress.
+
+Workers stamp ``heartbeat_at`` whenever they claim a job or report progress.
+A running job whose worker process is gone, or whose heartbeat is older than
+``stale_after`` seconds, is failed (or cancelled, if that was requested) by
+the next ``claim``, so a crashed worker cannot leave it running forever.
+
+Run a standalone worker with ``python jobs.py``.
+"""
+import json
+import os
+import sqlite3
+import sys
+import time
+from contextlib import closing
+
+import MySQLdb
+import MySQLdb.cursors
+
+# Make the repo-level ``shared`` package importable from a checkout and from the image
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared import accounts  # noqa: E402
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL DEFAULT '{}',
+    status TEXT NOT NULL DEFAULT 'queued',
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT,
+    result_path TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    worker_pid INTEGER,
+    heartbeat_at REAL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, id);
+"""
+
+# Job handlers by kind, registered with @job
+HANDLERS = {}
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def job(kind):
+    def register(handler):
+        HANDLERS[kind] = handler
+        return handler
+
+    return register
+
+
+def _process_exists(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Alive, but owned by another user
+        return True
+    return True
+
+
+class JobQueue:
+    def __init__(self, path, stale_after=300.0):
+        self.path = path
+        self.stale_after = stale_after
+        self._initialized = False
+
+    def _connect(self):
+        # Create the database on first use rather than when the app is imported
+        if not self._initialized:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "heartbeat_at" not in columns:
+                # Queue files created before heartbeats existed
+                conn.execute("ALTER TABLE jobs ADD COLUMN heartbeat_at REAL")
+            conn.close()
+            self._initialized = True
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def enqueue(self, kind, params=None):
+        if kind not in HANDLERS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "INSERT INTO jobs (kind, params, created_at) VALUES (?, ?, ?)",
+                (kind, json.dumps(params or {}), time.time()),
+            )
+            return cursor.lastrowid
+
+    def get(self, job_id):
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list(self, limit=50):
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def _recover_stale(self, conn):
+        """End running jobs whose worker died; call inside a write transaction."""
+        cutoff = time.time() - self.stale_after
+        for row in conn.execute(
+            "SELECT id, worker_pid, heartbeat_at, started_at, cancel_requested "
+            "FROM jobs WHERE status = ?",
+            (RUNNING,),
+        ).fetchall():
+            heartbeat = row["heartbeat_at"] or row["started_at"] or 0
+            if heartbeat >= cutoff and (
+                row["worker_pid"] is None or _process_exists(row["worker_pid"])
+            ):
+                continue
+            if row["cancel_requested"]:
+                status, message = CANCELLED, "Cancelled"
+            else:
+                status, message = FAILED, "The worker stopped before the job finished"
+            print(f"Job {row['id']} abandoned by worker {row['worker_pid']}")  # Log the error
+            conn.execute(
+                "UPDATE jobs SET status = ?, message = ?, finished_at = ? WHERE id = ?",
+                (status, message, time.time(), row["id"]),
+            )
+
+    def claim(self):
+        """Atomically move the oldest queued job to running and return it."""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            self._recover_stale(conn)
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY id LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, started_at = ?, heartbeat_at = ?, worker_pid = ? "
+                "WHERE id = ?",
+                (RUNNING, time.time(), time.time(), os.getpid(), row["id"]),
+            )
+            conn.execute("COMMIT")
+            return dict(row)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def report(self, job_id, progress, message=None):
+        """Store progress and return True if cancellation was requested."""
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET progress = ?, message = COALESCE(?, message), heartbeat_at = ? "
+                "WHERE id = ?",
+                (progress, message, time.time(), job_id),
+            )
+            row = conn.execute(
+                "SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return bool(row and row["cancel_requested"])
+
+    def finish(self, job_id, status, message=None, result_path=None):
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, message = ?, result_path = ?, finished_at = ?, "
+                "progress = CASE WHEN ? = 'succeeded' THEN 1 ELSE progress END WHERE id = ?",
+                (status, message, result_path, time.time(), status, job_id),
+            )
+
+    def cancel(self, job_id):
+        """Cancel a queued job now, or flag a running one; returns the new job row."""
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?",
+                (CANCELLED, time.time(), job_id, QUEUED),
+            )
+            conn.execute(
+                "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?",
+                (job_id, RUNNING),
+            )
+        return self.get(job_id)
+
+
+class JobContext:
+    """Handed to job handlers for progress reporting and output files."""
+
+    def __init__(self, queue, job_row, result_dir, db_settings):
+        self.queue = queue
+        self.job = job_row
+        self.params = json.loads(job_row["params"])
+        self.result_dir = result_dir
+        self.db_settings = db_settings
+
+    def progress(self, fraction, message=None):
+        if self.queue.report(self.job["id"], fraction, message):
+            raise JobCancelled()
+
+    def connect_db(self):
+        return MySQLdb.connect(**self.db_settings)
+
+
+@job("export_users")
+def export_users(ctx):
+    """Write all accounts (without password hashes) to a CSV file."""
+    import csv
+
+    conn = ctx.connect_db()
+    try:
+        cursor = conn.cursor()
+        total = accounts.count(cursor) or 1
+        cursor.close()
+
+        path = os.path.join(ctx.result_dir, f"users-{ctx.job['id']}.csv")
+        cursor = conn.cursor(MySQLdb.cursors.SSCursor)
+        accounts.select_for_export(cursor)
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["id", "username", "email", "role"])
+            written = 0
+            for row in cursor:
+                writer.writerow(row)
+                written += 1
+                if written % 1000 == 0:
+                    ctx.progress(min(written / total, 0.99), f"{written} rows exported")
+        cursor.close()
+        return path, f"{written} rows exported"
+    finally:
+        conn.close()
+
+
+def run_job(queue, job_row, result_dir, db_settings):
+    ctx = JobContext(queue, job_row, result_dir, db_settings)
+    try:
+        result_path, message = HANDLERS[job_row["kind"]](ctx)
+    except JobCancelled:
+        queue.finish(job_row["id"], CANCELLED, "Cancelled")
+    except Exception as e:
+        print(f"Job {job_row['id']} failed: {str(e)}")  # Log the error
+        queue.finish(job_row["id"], FAILED, str(e))
+    else:
+        queue.finish(job_row["id"], SUCCEEDED, message, result_path)
+
+
+def run_worker(queue_path, result_dir, db_settings, poll_interval=1.0, stale_after=300.0):
+    queue = JobQueue(queue_path, stale_after)
+    os.makedirs(result_dir, exist_ok=True)
+    while True:
+        job_row = queue.claim()
+        if job_row is None:
+            time.sleep(poll_interval)
+            continue
+        run_job(queue, job_row, result_dir, db_settings)
+
+
+def start_workers(count, queue_path, result_dir, db_settings, stale_after=300.0):
+    """Start ``count`` daemon worker processes; they exit with the parent."""
+    import multiprocessing
+
+    workers = []
+    for i in range(count):
+        process = multiprocessing.Process(
+            target=run_worker,
+            args=(queue_path, result_dir, db_settings),
+            kwargs={"stale_after": stale_after},
+            name=f"job-worker-{i}",
+            daemon=True,
+        )
+        process.start()
+        workers.append(process)
+    return workers
+
+
+if __name__ == "__main__":
+    from main import app, db_settings
+
+    run_worker(
+        app.config["JOBS_DB_PATH"],
+        app.config["JOBS_RESULT_DIR"],
+        db_settings(),
+        stale_after=app.config["JOBS_STALE_SECONDS"],
+    )
@@ -1,12 +1,67 @@
-from flask import Flask, render_template, request, redirect, url_for, session
+from flask import (
+    Flask,
+    Response,
+    abort,
+    jsonify,
+    make_response,
+    render_template,
+    request,
+    redirect,
+    send_file,
+    stream_template,
+    stream_with_context,
+    url_for,
+    session,
+)
+from markupsafe import Markup
 from flask_mysqldb import MySQL
 import MySQLdb.cursors
+import hmac
+import json
+import math
 import os
+import signal
+import sys
+import time
 from dotenv import load_dotenv
+from contextlib import closing
 from functools import wraps  # For route protection
-
+import jobs
+import search
+
+# Make the repo-level ``shared`` package importable from a checkout and from the image
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared import (  # noqa: E402
+    accounts,
+    admission,
+    identity_map,
+    outbox,
+    summary,
+    tracing,
+    validation,
+)
+from shared.activity import LoginActivity  # noqa: E402
+from shared.audit import AuditLog, FileAuditSink, MySQLAuditSink  # noqa: E402
+from shared.cache import LRUCache  # noqa: E402
+from shared.circuit_breaker import CircuitOpenError  # noqa: E402
+from shared.db import (  # noqa: E402
+    Database,
+    GuardedCursor,
+    breaker_from_env,
+    configure_timeouts,
+    connection_settings,
+)
+from shared.profiling import RequestProfiler, text_report  # noqa: E402
+from shared.startup import StartupProfiler  # noqa: E402
+from shared.templating import buffered, enable_bytecode_cache  # noqa: E402
+from shared.warmup import WarmUp, compile_templates  # noqa: E402
+
+# STARTUP_PROFILE=1 prints how long each startup phase took
+startup_profile = StartupProfiler()
 
 app = Flask(__name__)
+enable_bytecode_cache(app)
 
 # Secret key for session management
 # app.config["SECRET_KEY"] = os.environ["SECRET_KEY"]
@@ -14,24 +69,157 @@ load_dotenv()
 
 app.config["SECRET_KEY"] = os.getenv("SECRET_KEY")
 
+# Rows pulled from the unbuffered /users cursor per round trip
+app.config["USERS_FETCH_SIZE"] = int(os.getenv("USERS_FETCH_SIZE", "500"))
+
 # Database connection details
 app.config["MYSQL_HOST"] = os.getenv("MYSQL_HOST")
 app.config["MYSQL_USER"] = os.getenv("MYSQL_USER", "root")
 app.config["MYSQL_PASSWORD"] = os.getenv("MYSQL_PASSWORD", "example")
 app.config["MYSQL_DB"] = os.getenv("MYSQL_DB", "pythonlogin")
 
+configure_timeouts(app)
+# TRACE_EXPORTER=console|file turns on request tracing
+tracing.install(app, "admin-service")
+# PROFILE_TOKEN / PROFILE_SAMPLE_RATE turn on per-request cProfile captures
+request_profiler = RequestProfiler.from_env(
+    "admin-service", os.path.join(app.instance_path, "profiles")
+)
+request_profiler.install(app)
+
+
+def admission_priority(path):
+    # Probes bypass admission; logins go first and static files are shed first
+    # The change feed is capped separately (see feed_priority)
+    if path in ("/healthz", "/readyz", "/metrics") or path.startswith("/api/events"):
+        return None
+    if path == "/login":
+        return admission.HIGH
+    if path.startswith("/static/"):
+        return admission.LOW
+    return admission.NORMAL
+
+
+def feed_priority(path):
+    # Feed requests stay open for a long-poll or a stream, so they get their
+    # own small cap instead of holding the slots the admin pages need
+    return admission.LOW if path.startswith("/api/events") else None
+
+
+# ADMISSION_LIMIT concurrent requests; the excess waits briefly or gets a 503
+admission_control = admission.install(app, admission_priority)
+# EVENTS_MAX_CONSUMERS open feed requests; further consumers get a 503 at once
+feed_admission = admission.install(
+    app,
+    feed_priority,
+    admission.AdmissionController(int(os.getenv("EVENTS_MAX_CONSUMERS", "4")), max_queue=0),
+)
+startup_profile.mark("config")
+
 # Initialize MySQL
 mysql = MySQL(app)
 
-# Test database connection at application startup
-with app.app_context():
-    try:
-        cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
-        cursor.execute("SHOW DATABASES;")
-        databases = cursor.fetchall()
-        print("Databases available:", databases)
-    except Exception as e:
-        print("Error connecting to the database:", str(e))
+# Request-time queries go through a circuit breaker so an unhealthy database
+# makes requests fail fast instead of tying up every worker
+db = Database(lambda: mysql.connection, breaker_from_env())
+startup_profile.mark("db_init")
+
+
+def db_settings():
+    return connection_settings(app)
+
+
+def connect_db():
+    # Standalone connection for background workers that run outside a request
+    return MySQLdb.connect(**db_settings())
+
+
+# Connections owned by code that outlives the request's app context (streamed
+# bodies, feed polls); each use connects through the breaker and closes it
+standalone_db = Database(lambda: connect_db(), db.breaker)
+
+
+# Audit trail for admin mutations, written asynchronously by a background thread
+if os.getenv("AUDIT_SINK", "file") == "mysql":
+    audit_sink = MySQLAuditSink(connect_db)
+else:
+    audit_sink = FileAuditSink(
+        os.getenv("AUDIT_LOG_PATH", os.path.join(app.instance_path, "audit.log")),
+        max_bytes=int(os.getenv("AUDIT_LOG_MAX_BYTES", str(10 * 1024 * 1024))),
+        backup_count=int(os.getenv("AUDIT_LOG_BACKUPS", "5")),
+    )
+audit_log = AuditLog(
+    audit_sink,
+    maxsize=int(os.getenv("AUDIT_QUEUE_SIZE", "10000")),
+    policy=os.getenv("AUDIT_BACKPRESSURE", "drop"),
+)
+
+
+def audit(action, target_id, **details):
+    audit_log.record(session.get("username"), action, target_id, details)
+
+
+# last_login / login_count, buffered and written in coalesced batches
+login_activity = LoginActivity(
+    connect_db, flush_interval=float(os.getenv("LOGIN_ACTIVITY_FLUSH_SECONDS", "5"))
+)
+
+
+# Account search: MySQL indexes by default, in-process trie with SEARCH_BACKEND=memory
+app.config["SEARCH_BACKEND"] = os.getenv("SEARCH_BACKEND", "mysql")
+search_index = search.PrefixIndex(ttl=float(os.getenv("SEARCH_INDEX_TTL", "60")))
+
+
+def search_index_changed(account_id, row=None):
+    if app.config["SEARCH_BACKEND"] != "memory":
+        return
+    if row is None:
+        search_index.remove(account_id)
+    else:
+        search_index.add(dict(row, id=account_id))
+
+
+# Queue for slow admin operations, run by separate worker processes
+app.config["JOBS_DB_PATH"] = os.getenv(
+    "JOBS_DB_PATH", os.path.join(app.instance_path, "jobs.sqlite3")
+)
+app.config["JOBS_RESULT_DIR"] = os.getenv(
+    "JOBS_RESULT_DIR", os.path.join(app.instance_path, "exports")
+)
+# Running jobs without a progress report for this long are presumed abandoned
+app.config["JOBS_STALE_SECONDS"] = float(os.getenv("JOBS_STALE_SECONDS", "300"))
+job_queue = jobs.JobQueue(app.config["JOBS_DB_PATH"], app.config["JOBS_STALE_SECONDS"])
+startup_profile.mark("background_services")
+
+
+def check_database():
+    # Test database connection when the server starts (not on import)
+    with app.app_context():
+        try:
+            cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
+            cursor.execute("SHOW DATABASES;")
+            databases = cursor.fetchall()
+            print("Databases available:", databases)
+        except Exception as e:
+            print("Error connecting to the database:", str(e))
+
+
+@app.errorhandler(CircuitOpenError)
+def database_unavailable(e):
+    message = "The database is temporarily unavailable. Please try again shortly."
+    if request.path.startswith("/api/"):
+        response = make_response(jsonify(error=message), 503)
+    else:
+        response = make_response(render_template("error.html", message=message), 503)
+    response.headers["Retry-After"] = str(max(1, math.ceil(e.retry_after)))
+    return response
+
+
+def database_error(e, message="An error occurred. Please try again later."):
+    if isinstance(e, CircuitOpenError):
+        return database_unavailable(e)
+    print(f"Database error: {str(e)}")  # Log the error
+    return render_template("error.html", message=message), 500
 
 
 @app.before_request
@@ -40,6 +228,26 @@ def clear_session_on_start():
         session.clear()  # Asegúrate de que no haya residuos de sesiones previas.
 
 
+@app.route("/healthz")
+def healthz():
+    # Liveness only: no database access, so it answers as soon as the app is up
+    return {"status": "ok"}
+
+
+@app.route("/metrics")
+def metrics():
+    # Admission counters (admitted / shed per priority) for the scraper
+    body = admission_control.metrics() + feed_admission.metrics("events_admission")
+    return Response(body, mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/readyz")
+def readyz():
+    # Readiness: 503 until the warm-up has finished
+    status = warmup.status()
+    return status, 200 if status["ready"] else 503
+
+
 @app.route("/")
 def index():
     return redirect(url_for("login"))
@@ -62,18 +270,15 @@ def login():
     if request.method == "POST":
         username = request.form["username"]
         password = request.form["password"]
-        cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
-        cursor.execute(
-            "SELECT * FROM accounts WHERE username = %s AND password = SHA1(%s)",
-            (username, password),
-        )
-        account = cursor.fetchone()
+        cursor = db.cursor()
+        account = accounts.authenticate(cursor, username, accounts.hash_password(password))
         if account:
             session["loggedin"] = True
             session["id"] = account["id"]
             session["username"] = account["username"]
             session["role"] = account["role"]
-            return redirect(url_for("list_users"))
+            login_activity.record(account["id"])
+            return redirect(url_for("dashboard"))
         else:
             return "Invalid username or password."
     return render_template("login.html")
@@ -86,22 +291,162 @@ def logout():
     return redirect(url_for("login"))
 
 
+@app.route("/dashboard", methods=["GET"])
+@admin_required
+def dashboard():
+    try:
+        cursor = db.cursor()
+        if request.args.get("refresh"):
+            # Full recount to repair any drift in the materialized summary
+            counts = summary.rebuild(cursor)
+            db.commit()
+        else:
+            counts = summary.read(cursor)
+            if not counts:
+                # Keep the fallback recount so later loads read the summary
+                counts = summary.rebuild(cursor)
+                db.commit()
+        return render_template(
+            "dashboard.html", counts=counts, total=sum(counts.values())
+        )
+    except Exception as e:
+        return database_error(e, "An error occurred while loading the dashboard.")
+
+
+# Rendered <tr> fragments for the users table, keyed by row id + version
+user_row_cache = LRUCache(maxsize=int(os.getenv("USER_ROW_CACHE_SIZE", "10000")))
+
+
+def user_row_version(user):
+    # Every edit bumps ``version``; login activity changes without bumping it
+    return (user["version"], user.get("last_login"), user.get("login_count"))
+
+
+def user_row_urls():
+    # Resolve the action URLs once per page instead of twice per row
+    return (
+        url_for("edit_user", user_id=0).rpartition("/")[0],
+        url_for("delete_user", user_id=0).rpartition("/")[0],
+    )
+
+
+@app.template_global()
+def render_user_row(user, row_urls):
+    key = (user["id"], user_row_version(user), row_urls)
+
+    def render():
+        edit_prefix, delete_prefix = row_urls
+        template = app.jinja_env.get_template("_user_row.html")
+        return Markup(
+            template.render(user=user, edit_prefix=edit_prefix, delete_prefix=delete_prefix)
+        )
+
+    return user_row_cache.get_or_set(key, render)
+
+
+class UserRows:
+    """Rows of a server-side cursor, fetched in batches while the page streams.
+
+    Owns its connection: the request's connection is closed at teardown,
+    before a streamed body is sent. ``failed`` tells the template that the
+    listing stopped early.
+    """
+
+    def __init__(self, connection, cursor, size):
+        self.connection = connection
+        self.cursor = cursor
+        self.size = size
+        self.failed = False
+
+    def __iter__(self):
+        try:
+            while True:
+                rows = self.cursor.fetchmany(self.size)
+                yield from rows
+                if len(rows) < self.size:
+                    break
+        except Exception as e:
+            # Headers are already sent; the template ends the table with an error row
+            self.failed = True
+            print(f"Error streaming users: {str(e)}")  # Log the error
+        finally:
+            self.close()
+
+    def close(self):
+        try:
+            self.cursor.close()
+        finally:
+            self.connection.close()
+
+
 @app.route("/users", methods=["GET"])
 @admin_required
 def list_users():
     try:
-        cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
-        cursor.execute("SELECT * FROM accounts")
-        users = cursor.fetchall()
-        return render_template("users.html", users=users)
+        connection = standalone_db.connection
     except Exception as e:
-        print(f"Error fetching users: {str(e)}")  # Log the error
-        return (
-            render_template(
-                "error.html", message="An error occurred while fetching users."
-            ),
-            500,
+        return database_error(e, "An error occurred while fetching users.")
+    try:
+        cursor = GuardedCursor(
+            connection.cursor(MySQLdb.cursors.SSDictCursor), standalone_db.breaker, unbuffered=True
         )
+        accounts.select_all(cursor)
+    except Exception as e:
+        connection.close()
+        return database_error(e, "An error occurred while fetching users.")
+    users = UserRows(connection, cursor, app.config["USERS_FETCH_SIZE"])
+    # Stream the page so the table header and first rows reach the browser
+    # before the remaining accounts have been read
+    return Response(
+        buffered(stream_template("users.html", users=users, row_urls=user_row_urls())),
+        mimetype="text/html",
+    )
+
+
+VALIDATION_ERRORS = {
+    validation.MISSING_FIELDS: "Please fill out all required fields.",
+    validation.INVALID_EMAIL: "Invalid email format. Please try again.",
+    validation.INVALID_USERNAME: (
+        "Invalid username. Use only letters, numbers and underscores "
+        f"(at most {validation.USERNAME_MAX_LENGTH} characters)."
+    ),
+    validation.INVALID_ROLE: "Invalid role. Please choose admin or user.",
+}
+
+
+@app.route("/api/users/search", methods=["GET"])
+@admin_required
+def search_users():
+    query = request.args.get("q", "").strip()
+    limit = search.clamp_limit(request.args.get("limit"))
+    if len(query) < search.MIN_QUERY_LENGTH:
+        return jsonify([])
+    try:
+        cursor = db.cursor()
+        if app.config["SEARCH_BACKEND"] == "memory":
+            if search_index.is_stale():
+                accounts.select_all(cursor)
+                search_index.rebuild(cursor.fetchall())
+            results = search_index.search(query, limit)
+        else:
+            results = accounts.search(cursor, query, limit)
+        return jsonify(
+            [
+                {
+                    "id": row["id"],
+                    "username": row["username"],
+                    "email": row["email"],
+                    "role": row["role"],
+                    "edit_url": url_for("edit_user", user_id=row["id"]),
+                }
+                for row in results
+            ]
+        )
+    except CircuitOpenError:
+        raise
+    except Exception as e:
+        print(f"Error searching users: {str(e)}")  # Log the error
+        return jsonify(error="An error occurred while searching users."), 500
 
 
 @app.route("/add_user", methods=["GET", "POST"])
@@ -113,102 +458,479 @@ def add_user():
         email = request.form["email"]
         role = request.form["role"]
 
-        try:
-            cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
+        # Validate input before touching the database
+        error = validation.validate_account(username, email, password, role)
+        if error:
+            return VALIDATION_ERRORS[error]
 
-            # Check for valid email format
-            if "@" not in email or "." not in email:
-                return "Invalid email format. Please try again."
+        try:
+            cursor = db.cursor()
 
             # Check if username is already taken
-            cursor.execute("SELECT * FROM accounts WHERE username = %s", (username,))
-            if cursor.fetchone():
+            if accounts.username_taken(cursor, username):
                 return "Username already exists. Please choose another."
 
             # Check if email is already registered
-            cursor.execute("SELECT * FROM accounts WHERE email = %s", (email,))
-            if cursor.fetchone():
+            if accounts.email_taken(cursor, email):
                 return "Email already exists. Please choose another."
 
-            # Insert user into the database
-            cursor.execute(
-                "INSERT INTO accounts (username, password, email, role) VALUES (%s, SHA1(%s), %s, %s)",
-                (username, password, email, role),
+            # Insert user into the database, keeping the role counts in step
+            user_id = accounts.create(
+                cursor, username, accounts.hash_password(password), email, role
             )
-            mysql.connection.commit()
+            summary.account_added(cursor, role)
+            outbox.record(
+                cursor, outbox.CREATED, user_id, {"username": username, "email": email, "role": role}
+            )
+            db.commit()
+            search_index_changed(user_id, {"username": username, "email": email, "role": role})
+            audit("user.create", user_id, username=username, email=email, role=role)
             return redirect(url_for("list_users"))
         except Exception as e:
-            return f"An error occurred: {str(e)}"
+            return database_error(e)
     return render_template("add_user.html")
 
 
+def load_account(cursor, user_id):
+    # Reuse the row if this request already loaded it
+    user = identity_map.current().get("accounts", user_id)
+    if user is None:
+        user = accounts.get(cursor, user_id)
+        if user:
+            identity_map.current().add("accounts", user_id, user)
+    return user
+
+
+class EditRejected(Exception):
+    """An account edit that was not saved.
+
+    ``current`` holds the latest row when the edit lost a concurrent update.
+    """
+
+    def __init__(self, message, status, current=None):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.current = current
+
+
+EDIT_CONFLICT = "This user was changed by someone else. Review the current values and try again."
+JSON_OBJECT_REQUIRED = "The request body must be a JSON object."
+
+
+def save_account_edit(user_id, fields, expected_version=None):
+    """Validate and apply an edit without locks; returns the updated row.
+
+    The update only succeeds if the row is still at ``expected_version``
+    (default: the version read here), so concurrent edits never overwrite
+    each other silently.
+    """
+    username = fields["username"]
+    email = fields["email"]
+    role = fields["role"]
+    password = fields.get("password") or ""
+
+    # Validate input before touching the database (password is optional here)
+    error = validation.validate_account(username, email, password, role, require_password=False)
+    if error:
+        raise EditRejected(VALIDATION_ERRORS[error], 400)
+
+    cursor = db.cursor()
+
+    # One query loads the current row and any account that already
+    # uses the new username or email
+    user = None
+    for row in accounts.with_identity(cursor, user_id, username, email):
+        if row["id"] == user_id:
+            user = identity_map.current().add("accounts", user_id, row)
+        elif row["username"].lower() == username.lower():
+            raise EditRejected("Username already exists. Please choose another.", 409)
+        elif row["email"].lower() == email.lower():
+            raise EditRejected("Email already exists. Please choose another.", 409)
+    if user is None:
+        raise EditRejected(f"User with ID {user_id} not found.", 404)
+    if expected_version is None:
+        expected_version = user["version"]
+    if user["version"] != expected_version:
+        raise EditRejected(EDIT_CONFLICT, 412, current=user)
+
+    # Update user with or without password; the password only changes when
+    # a new one is provided
+    password_hash = accounts.hash_password(password) if password else None
+    if not accounts.update(cursor, user_id, expected_version, username, email, role, password_hash):
+        # Another edit won between the read and the write; end the transaction
+        db.rollback()
+        identity_map.current().discard("accounts", user_id)
+        current = accounts.get(cursor, user_id)
+        if current is None:
+            raise EditRejected(f"User with ID {user_id} not found.", 404)
+        raise EditRejected(EDIT_CONFLICT, 412, current=current)
+    # The swap succeeded, so the row still had the role read above
+    summary.role_changed(cursor, user["role"], role)
+    outbox.record(
+        cursor,
+        outbox.UPDATED,
+        user_id,
+        {"username": username, "email": email, "role": role, "version": expected_version + 1},
+    )
+    db.commit()
+    user = dict(user, username=username, email=email, role=role, version=expected_version + 1)
+    identity_map.current().add("accounts", user_id, user)
+    search_index_changed(user_id, {"username": username, "email": email, "role": role})
+    audit(
+        "user.update",
+        user_id,
+        username=username,
+        email=email,
+        role=role,
+        password_changed=bool(password),
+    )
+    return user
+
+
 @app.route("/edit_user/<int:user_id>", methods=["GET", "POST"])
 @admin_required
 def edit_user(user_id):
     try:
-        cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
         if request.method == "POST":
-            username = request.form["username"]
-            email = request.form["email"]
-            role = request.form["role"]
-            password = request.form["password"]
-
-            # Check for valid email format
-            if "@" not in email or "." not in email:
-                return "Invalid email format. Please try again."
-
-            # Check if username is already taken (excluding current user)
-            cursor.execute(
-                "SELECT * FROM accounts WHERE username = %s AND id != %s",
-                (username, user_id),
-            )
-            if cursor.fetchone():
-                return "Username already exists. Please choose another."
-
-            # Check if email is already registered (excluding current user)
-            cursor.execute(
-                "SELECT * FROM accounts WHERE email = %s AND id != %s", (email, user_id)
-            )
-            if cursor.fetchone():
-                return "Email already exists. Please choose another."
-
-            # Update user with or without password
-            if password:  # If a new password is provided
-                cursor.execute(
-                    "UPDATE accounts SET username = %s, email = %s, role = %s, password = SHA1(%s) WHERE id = %s",
-                    (username, email, role, password, user_id),
-                )
-            else:
-                cursor.execute(
-                    "UPDATE accounts SET username = %s, email = %s, role = %s WHERE id = %s",
-                    (username, email, role, user_id),
-                )
-
-            mysql.connection.commit()
+            try:
+                save_account_edit(user_id, request.form, request.form.get("version", type=int))
+            except EditRejected as e:
+                if e.current is None:
+                    return e.message
+                # Show the latest values; resubmitting applies the edit on top of them
+                return render_template("edit_user.html", user=e.current, conflict=e.message), 409
             return redirect(url_for("list_users"))
         else:
-            cursor.execute("SELECT * FROM accounts WHERE id = %s", (user_id,))
-            user = cursor.fetchone()
+            cursor = db.cursor()
+            user = load_account(cursor, user_id)
             if user:
                 return render_template("edit_user.html", user=user)
             else:
                 return f"User with ID {user_id} not found."
     except Exception as e:
-        return f"An error occurred: {str(e)}"
+        return database_error(e)
+
+
+def account_json(user):
+    response = jsonify(
+        id=user["id"],
+        username=user["username"],
+        email=user["email"],
+        role=user["role"],
+        version=user["version"],
+    )
+    response.set_etag(str(user["version"]))
+    return response
+
+
+@app.route("/api/users/<int:user_id>", methods=["GET", "PUT"])
+@admin_required
+def api_user(user_id):
+    if request.method == "GET":
+        try:
+            user = load_account(db.cursor(), user_id)
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            print(f"Error loading user: {str(e)}")  # Log the error
+            return jsonify(error="An error occurred while loading the user."), 500
+        if user is None:
+            abort(404)
+        return account_json(user).make_conditional(request)
+
+    # Writes must say which version they were based on
+    if "If-Match" not in request.headers:
+        return jsonify(error="If-Match header with the user's ETag is required."), 428
+    expected_version = None
+    if not request.if_match.star_tag:
+        versions = [int(tag) for tag in request.if_match.as_set() if tag.isdigit()]
+        if len(versions) != 1:
+            return jsonify(error=EDIT_CONFLICT), 412
+        expected_version = versions[0]
+    fields = request.get_json(silent=True)
+    if not isinstance(fields, dict):
+        return jsonify(error=JSON_OBJECT_REQUIRED), 400
+    if not all(fields.get(key) and isinstance(fields[key], str) for key in ("username", "email", "role")):
+        return jsonify(error=VALIDATION_ERRORS[validation.MISSING_FIELDS]), 400
+    try:
+        user = save_account_edit(user_id, fields, expected_version)
+    except EditRejected as e:
+        response = jsonify(error=e.message)
+        response.status_code = e.status
+        if e.current is not None:
+            response.set_etag(str(e.current["version"]))
+        return response
+    except CircuitOpenError:
+        raise
+    except Exception as e:
+        print(f"Error updating user: {str(e)}")  # Log the error
+        return jsonify(error="An error occurred while updating the user."), 500
+    return account_json(user)
 
 
 @app.route("/delete_user/<int:user_id>", methods=["POST"])
 @admin_required
 def delete_user(user_id):
     try:
-        cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
-        # Delete user from the database
-        cursor.execute("DELETE FROM accounts WHERE id = %s", (user_id,))
-        mysql.connection.commit()
+        cursor = db.cursor()
+        # Only mark the row deleted; the purger removes it later in small
+        # batches. The role counts are kept in step.
+        if accounts.soft_delete(cursor, user_id):
+            summary.account_removed(cursor, user_id)
+            outbox.record(cursor, outbox.DELETED, user_id)
+        db.commit()
+        search_index_changed(user_id)
+        audit("user.delete", user_id)
         return redirect(url_for("list_users"))
     except Exception as e:
-        return f"An error occurred: {str(e)}"
+        return database_error(e)
+
+
+# Account change feed for other systems (see shared/outbox.py)
+app.config["EVENTS_TOKEN"] = os.getenv("EVENTS_TOKEN")
+app.config["EVENTS_GAP_TIMEOUT"] = float(os.getenv("EVENTS_GAP_TIMEOUT", "5"))
+app.config["EVENTS_POLL_INTERVAL"] = float(os.getenv("EVENTS_POLL_INTERVAL", "0.5"))
+app.config["EVENTS_MAX_WAIT"] = float(os.getenv("EVENTS_MAX_WAIT", "30"))
+
+
+def events_authorized():
+    # Machine consumers send a bearer token; admins can use their session
+    token = app.config["EVENTS_TOKEN"]
+    supplied = request.headers.get("Authorization", "")
+    if token and hmac.compare_digest(supplied.encode(), f"Bearer {token}".encode()):
+        return True
+    return session.get("loggedin") and session.get("role") == "admin"
+
+
+def read_events(after, limit):
+    # Each poll connects on its own and disconnects before the consumer
+    # sleeps, so a waiting consumer does not hold a database connection
+    with closing(standalone_db.connection) as conn:
+        cursor = GuardedCursor(conn.cursor(MySQLdb.cursors.DictCursor), standalone_db.breaker)
+        return outbox.read_since(cursor, after, limit, app.config["EVENTS_GAP_TIMEOUT"])
+
+
+@app.route("/api/events", methods=["GET"])
+def api_events():
+    """Events after ``after``; waits up to ``wait`` seconds for new ones."""
+    if not events_authorized():
+        return jsonify(error="Authentication required."), 401
+    after = request.args.get("after", 0, type=int)
+    limit = outbox.clamp_limit(request.args.get("limit"))
+    wait = min(max(request.args.get("wait", 0, type=float), 0), app.config["EVENTS_MAX_WAIT"])
+    deadline = time.monotonic() + wait
+    try:
+        events = read_events(after, limit)
+        while not events and time.monotonic() < deadline:
+            time.sleep(app.config["EVENTS_POLL_INTERVAL"])
+            events = read_events(after, limit)
+    except CircuitOpenError:
+        raise
+    except Exception as e:
+        print(f"Error reading account events: {str(e)}")  # Log the error
+        return jsonify(error="An error occurred while reading events."), 500
+    return jsonify(events=events, last_seq=events[-1]["seq"] if events else after)
+
+
+@app.route("/api/events/stream", methods=["GET"])
+def api_event_stream():
+    """Server-Sent Events; reconnecting clients resume from Last-Event-ID."""
+    if not events_authorized():
+        return jsonify(error="Authentication required."), 401
+    after = request.headers.get("Last-Event-ID", request.args.get("after", "0"))
+    after = int(after) if after.isdigit() else 0
+
+    def generate(after):
+        # Streams end after EVENTS_MAX_WAIT so a connection does not hold a
+        # worker forever; EventSource reconnects on its own
+        yield "retry: 1000\n\n"
+        deadline = time.monotonic() + app.config["EVENTS_MAX_WAIT"]
+        try:
+            while time.monotonic() < deadline:
+                events = read_events(after, outbox.MAX_BATCH)
+                for event in events:
+                    yield f"id: {event['seq']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+                    after = event["seq"]
+                if not events:
+                    yield ": idle\n\n"
+                    time.sleep(app.config["EVENTS_POLL_INTERVAL"])
+        except Exception as e:
+            print(f"Error streaming events: {str(e)}")  # Log the error
+
+    return Response(
+        stream_with_context(generate(after)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def job_summary(job):
+    return {
+        "id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "progress": job["progress"],
+        "message": job["message"],
+        "cancel_requested": bool(job["cancel_requested"]),
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "has_result": bool(job["result_path"]),
+    }
+
+
+@app.route("/jobs", methods=["GET", "POST"])
+@admin_required
+def list_jobs():
+    if request.method == "POST":
+        kind = request.form["kind"]
+        if kind not in jobs.HANDLERS:
+            return f"Unknown job: {kind}", 400
+        job_id = job_queue.enqueue(kind)
+        audit("job.create", job_id, kind=kind)
+        return redirect(url_for("list_jobs"))
+    return render_template(
+        "jobs.html", jobs=job_queue.list(), kinds=sorted(jobs.HANDLERS)
+    )
+
+
+@app.route("/jobs/<int:job_id>/cancel", methods=["POST"])
+@admin_required
+def cancel_job(job_id):
+    job = job_queue.cancel(job_id)
+    if job is None:
+        abort(404)
+    audit("job.cancel", job_id)
+    if request.accept_mimetypes.best == "application/json":
+        return jsonify(job_summary(job))
+    return redirect(url_for("list_jobs"))
+
+
+@app.route("/jobs/<int:job_id>/result")
+@admin_required
+def job_result(job_id):
+    job = job_queue.get(job_id)
+    if job is None or job["status"] != jobs.SUCCEEDED or not job["result_path"]:
+        abort(404)
+    return send_file(job["result_path"], as_attachment=True)
+
+
+@app.route("/api/jobs", methods=["GET", "POST"])
+@admin_required
+def api_jobs():
+    if request.method == "POST":
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict):
+            return jsonify(error=JSON_OBJECT_REQUIRED), 400
+        kind = body.get("kind")
+        if not isinstance(kind, str) or kind not in jobs.HANDLERS:
+            return jsonify(error=f"Unknown job: {kind}"), 400
+        job_id = job_queue.enqueue(kind)
+        audit("job.create", job_id, kind=kind)
+        response = jsonify(job_summary(job_queue.get(job_id)))
+        response.status_code = 202
+        response.headers["Location"] = url_for("api_job_status", job_id=job_id)
+        return response
+    return jsonify([job_summary(job) for job in job_queue.list()])
+
+
+@app.route("/api/jobs/<int:job_id>", methods=["GET"])
+@admin_required
+def api_job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        abort(404)
+    return jsonify(job_summary(job))
+
+
+@app.route("/profiles")
+@admin_required
+def list_profiles():
+    return render_template(
+        "profiles.html",
+        profiles=request_profiler.list(),
+        enabled=request_profiler.enabled,
+    )
+
+
+@app.route("/profiles/<name>")
+@admin_required
+def download_profile(name):
+    path = request_profiler.path(name)
+    if path is None:
+        abort(404)
+    if request.args.get("format") == "text":
+        return Response(text_report(path), mimetype="text/plain")
+    return send_file(path, as_attachment=True, download_name=name)
+
+
+startup_profile.mark("routes")
+startup_profile.install(app)
+
+
+# Work done before the instance reports ready, so first requests are not slow
+warmup = WarmUp()
+
+
+@warmup.step("database", required=True)
+def warm_database():
+    with app.app_context():
+        cursor = db.cursor()
+        cursor.execute("SELECT 1")
+        cursor.fetchone()
+
+
+@warmup.step("templates")
+def warm_templates():
+    return compile_templates(app)
+
+
+@warmup.step("user_rows")
+def warm_user_rows():
+    # Pre-render the row fragments of the first page of /users
+    limit = int(os.getenv("WARMUP_ACCOUNTS", "1000"))
+    if limit <= 0:
+        return 0
+    with app.test_request_context():
+        cursor = db.cursor()
+        accounts.select_all(cursor, limit)
+        rows = cursor.fetchall()
+        row_urls = user_row_urls()
+        for user in rows:
+            render_user_row(user, row_urls)
+    return len(rows)
+
+
+def shutdown(signum, frame):
+    """SIGTERM handler: flush the audit log and login activity, then exit.
+
+    As PID 1 in the container the process would otherwise ignore SIGTERM,
+    get killed once the stop timeout runs out and lose queued audit events
+    and buffered logins.
+    """
+    audit_log.close()
+    login_activity.close()
+    sys.exit(0)
 
 
 if __name__ == "__main__":
+    signal.signal(signal.SIGTERM, shutdown)
+    check_database()
+    startup_profile.mark("db_check")
+    jobs.start_workers(
+        int(os.getenv("JOB_WORKERS", "1")),
+        app.config["JOBS_DB_PATH"],
+        app.config["JOBS_RESULT_DIR"],
+        db_settings(),
+        stale_after=app.config["JOBS_STALE_SECONDS"],
+    )
+    startup_profile.mark("job_workers")
+    accounts.Purger(
+        connect_db,
+        batch_size=int(os.getenv("PURGE_BATCH_SIZE", "500")),
+        pause=float(os.getenv("PURGE_PAUSE_SECONDS", "0.5")),
+        interval=float(os.getenv("PURGE_INTERVAL_SECONDS", "60")),
+    ).start()
+    warmup.start()
     app.run(host="0.0.0.0", port=5000, debug=False)
@@ -0,0 +1,142 @@
+"""Prefix search over account usernames and emails.
+
+MySQL serves searches from B-tree indexes (see ``shared.accounts.search``).
+``PrefixIndex`` is an in-process trie used instead when
+``SEARCH_BACKEND=memory``, for databases that lack those indexes.
+"""
+import bisect
+import heapq
+import threading
+import time
+
+MIN_QUERY_LENGTH = 2
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+
+class _Node:
+    __slots__ = ("children", "ids", "first")
+
+    def __init__(self):
+        self.children = {}
+        self.ids = set()
+        # Up to MAX_LIMIT (username, id) pairs below this node, in order
+        self.first = []
+
+
+class PrefixIndex:
+    """Case-insensitive trie from username/email prefixes to account rows.
+
+    Each node keeps the ids of every key below it plus the first
+    ``MAX_LIMIT`` of them in username order, so a lookup walks ``len(query)``
+    nodes and slices that list; only a larger ``limit`` sorts the whole
+    subtree. Email domains are indexed under ``@domain`` to match the MySQL
+    backend.
+    """
+
+    def __init__(self, ttl=60.0):
+        self.ttl = ttl
+        self._root = _Node()
+        self._rows = {}
+        self._keys = {}
+        self._built_at = None
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _row_keys(row):
+        email = row["email"].lower()
+        return {row["username"].lower(), email, "@" + email.rpartition("@")[2]}
+
+    def _order(self, account_id):
+        return self._rows[account_id]["username"].lower(), account_id
+
+    def _offer(self, node, account_id, entry):
+        if account_id in node.ids:
+            # Node shared with another key of the same row
+            return
+        node.ids.add(account_id)
+        first = node.first
+        if len(first) < MAX_LIMIT:
+            bisect.insort(first, entry)
+        elif entry < first[-1]:
+            bisect.insort(first, entry)
+            first.pop()
+
+    def _insert(self, key, account_id):
+        entry = self._order(account_id)
+        node = self._root
+        self._offer(node, account_id, entry)
+        for char in key:
+            node = node.children.setdefault(char, _Node())
+            self._offer(node, account_id, entry)
+
+    def _delete(self, key, account_id):
+        entry = self._order(account_id)
+        node = self._root
+        path = [node]
+        for char in key:
+            node = node.children.get(char)
+            if node is None:
+                break
+            path.append(node)
+        for node in path:
+            node.ids.discard(account_id)
+            index = bisect.bisect_left(node.first, entry)
+            if index < len(node.first) and node.first[index] == entry:
+                del node.first[index]
+                if len(node.ids) > len(node.first):
+                    # Refill from the ids that were past the cut-off
+                    node.first = heapq.nsmallest(MAX_LIMIT, map(self._order, node.ids))
+
+    def add(self, row):
+        with self._lock:
+            self.remove(row["id"])
+            row = {column: row[column] for column in ("id", "username", "email", "role")}
+            keys = self._row_keys(row)
+            self._rows[row["id"]] = row
+            self._keys[row["id"]] = keys
+            for key in keys:
+                self._insert(key, row["id"])
+
+    def remove(self, account_id):
+        with self._lock:
+            if account_id not in self._rows:
+                return
+            # Drop the row last: _delete looks up its username
+            for key in self._keys.pop(account_id):
+                self._delete(key, account_id)
+            self._rows.pop(account_id)
+
+    def rebuild(self, rows):
+        with self._lock:
+            self._root = _Node()
+            self._rows = {}
+            self._keys = {}
+            # In username order the per-node lists fill by appending
+            for row in sorted(rows, key=lambda row: (row["username"].lower(), row["id"])):
+                self.add(row)
+            self._built_at = time.monotonic()
+
+    def is_stale(self):
+        return self._built_at is None or time.monotonic() - self._built_at > self.ttl
+
+    def search(self, query, limit):
+        with self._lock:
+            node = self._root
+            for char in query.lower():
+                node = node.children.get(char)
+                if node is None:
+                    return []
+            if limit <= MAX_LIMIT or len(node.ids) == len(node.first):
+                first = node.first[:limit]
+            else:
+                first = sorted(map(self._order, node.ids))[:limit]
+            return [self._rows[account_id] for _, account_id in first]
+
+
+def clamp_limit(value):
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_LIMIT
+    return max(1, min(limit, MAX_LIMIT))
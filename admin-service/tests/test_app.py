@@ -1,3 +1,4 @@
+import signal
 import pytest
 from unittest.mock import MagicMock, patch
 from main import app
@@ -17,9 +18,58 @@ def mock_mysql():
     with patch("main.mysql") as mock_mysql:
         mock_connection = MagicMock()
         mock_cursor = MagicMock()
+        mock_cursor.rowcount = 1  # Las escrituras de una fila tienen éxito por defecto
         mock_connection.cursor.return_value = mock_cursor
         mock_mysql.connection = mock_connection
-        yield mock_cursor  # Permite personalizar el mock dentro de los tests
+        # Las conexiones propias (listados en streaming, feed) usan el mismo cursor
+        with patch("main.MySQLdb.connect", return_value=mock_connection):
+            yield mock_cursor  # Permite personalizar el mock dentro de los tests
+
+
+# Cola de trabajos aislada por test
+@pytest.fixture(autouse=True)
+def job_queue(tmp_path):
+    import jobs
+
+    with patch("main.job_queue", jobs.JobQueue(str(tmp_path / "jobs.sqlite3"))) as queue:
+        yield queue
+
+
+# Evita escribir el registro de auditoría durante los tests
+@pytest.fixture(autouse=True)
+def mock_audit():
+    with patch("main.audit_log") as mock_audit_log:
+        yield mock_audit_log
+
+
+# Sin límite de concurrencia: el cliente de test no siempre cierra las respuestas
+@pytest.fixture(autouse=True)
+def admission_control():
+    from main import admission_control
+
+    from main import feed_admission
+
+    with patch.object(admission_control, "limit", 0), patch.object(feed_admission, "limit", 0):
+        yield admission_control
+
+
+# El feed de eventos abre su propia conexión en cada consulta
+@pytest.fixture
+def events_cursor():
+    with patch("main.MySQLdb.connect") as mock_connect:
+        mock_cursor = MagicMock()
+        mock_connect.return_value.cursor.return_value = mock_cursor
+        mock_cursor.connect = mock_connect
+        yield mock_cursor
+
+
+# Actividad de login en memoria, sin escribir en la base de datos
+@pytest.fixture(autouse=True)
+def login_activity():
+    from shared.activity import LoginActivity
+
+    with patch("main.login_activity", LoginActivity(MagicMock(), flush_interval=3600)) as activity:
+        yield activity
 
 
 def test_login_success(mock_mysql, client):
@@ -38,9 +88,9 @@ def test_login_success(mock_mysql, client):
         follow_redirects=True,
     )
 
-    # Aserciones
+    # Aserciones: tras el login se muestra el dashboard
     assert response.status_code == 200
-    assert b"Users Management" in response.data
+    assert b"Dashboard" in response.data
 
 
 def test_login_failure(mock_mysql, client):
@@ -61,8 +111,8 @@ def test_login_failure(mock_mysql, client):
 
 def test_list_users(mock_mysql, client):
     # Configura el mock para devolver una lista de usuarios
-    mock_mysql.fetchall.return_value = [
-        {"id": 1, "username": "test_user", "email": "test@example.com", "role": "admin"}
+    mock_mysql.fetchmany.return_value = [
+        {"id": 1, "username": "test_user", "email": "test@example.com", "role": "admin", "version": 1}
     ]
 
     # Simula una sesión autenticada
@@ -168,8 +218,10 @@ def test_edit_user_get(mock_mysql, client):
 
 
 def test_edit_user_post(mock_mysql, client):
-    # Mock para verificar usuario duplicado
-    mock_mysql.fetchone.side_effect = [None, None]  # No hay duplicados
+    # Una sola consulta devuelve la fila actual y no hay duplicados
+    mock_mysql.fetchall.return_value = [
+        {"id": 1, "username": "test_user", "email": "test@example.com", "role": "user", "version": 1}
+    ]
 
     # Simula una sesión autenticada
     with client.session_transaction() as sess:
@@ -304,3 +356,856 @@ def test_logout(client):
     # Verifica que redirija al login
     assert response.status_code == 200
     assert b"Login" in response.data
+
+
+def test_add_user_invalid_username_skips_database(mock_mysql, client):
+    # Simula una sesión autenticada
+    with client.session_transaction() as sess:
+        sess["loggedin"] = True
+        sess["role"] = "admin"
+
+    response = client.post(
+        "/add_user",
+        data={
+            "username": "bad user!",
+            "password": "password123",
+            "email": "new@example.com",
+            "role": "user",
+        },
+    )
+
+    # La validación rechaza la petición antes de consultar la base de datos
+    assert b"Invalid username. Use only letters, numbers and underscores" in response.data
+    mock_mysql.execute.assert_not_called()
+
+
+def test_list_users_reuses_cached_rows(mock_mysql, client):
+    from main import user_row_cache
+
+    user_row_cache.clear()
+    mock_mysql.fetchmany.return_value = [
+        {"id": 1, "username": "test_user", "email": "test@example.com", "role": "admin", "version": 1},
+        {"id": 2, "username": "other_user", "email": "other@example.com", "role": "user", "version": 1},
+    ]
+
+    # Simula una sesión autenticada
+    with client.session_transaction() as sess:
+        sess["loggedin"] = True
+        sess["role"] = "admin"
+
+    first = client.get("/users")
+    assert user_row_cache.misses == 2
+
+    # Solo la fila modificada se vuelve a renderizar
+    mock_mysql.fetchmany.return_value[1] = {
+        "id": 2, "username": "renamed_user", "email": "other@example.com", "role": "user",
+        "version": 2,
+    }
+    second = client.get("/users")
+
+    assert user_row_cache.hits == 1
+    assert user_row_cache.misses == 3
+    assert b'action="/delete_user/1"' in first.data
+    assert b'href="/edit_user/2"' in second.data
+    assert b"renamed_user" in second.data
+
+
+def test_list_users_streams_in_batches(mock_mysql, client):
+    app.config["USERS_FETCH_SIZE"] = 2
+    rows = [
+        {"id": i, "username": f"user{i}", "email": f"user{i}@example.com", "role": "user", "version": 1}
+        for i in range(1, 6)
+    ]
+    mock_mysql.fetchmany.side_effect = [rows[0:2], rows[2:4], rows[4:]]
+
+    # Simula una sesión autenticada
+    with client.session_transaction() as sess:
+        sess["loggedin"] = True
+        sess["role"] = "admin"
+
+    try:
+        response = client.get("/users")
+        assert response.is_streamed
+        assert b"user5@example.com" in response.data
+    finally:
+        app.config["USERS_FETCH_SIZE"] = 500
+
+    # Una lectura por lote y el cursor se cierra al terminar
+    assert mock_mysql.fetchmany.call_count == 3
+    mock_mysql.close.assert_called_once()
+
+
+class ClosableConnection:
+    """Conexión falsa que, como MySQLdb, falla una vez cerrada."""
+
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+        self.closed = False
+
+    def cursor(self, *args):
+        connection = self
+        cursor = MagicMock()
+
+        def fetchmany(size):
+            if connection.closed:
+                raise Exception("connection closed")
+            batch, connection.rows = connection.rows[:size], connection.rows[size:]
+            return batch
+
+        cursor.fetchmany.side_effect = fetchmany
+        return cursor
+
+    def close(self):
+        self.closed = True
+
+
+def test_list_users_survives_request_teardown(mock_mysql, client):
+    rows = [{"id": 901, "username": "streamed_user", "email": "s@example.com", "role": "user", "version": 1}]
+    request_connection = ClosableConnection()
+    own_connection = ClosableConnection(rows)
+
+    # Simula una sesión autenticada
+    with client.session_transaction() as sess:
+        sess["loggedin"] = True
+        sess["role"] = "admin"
+
+    # Flask-MySQLdb cierra la conexión de la petición en el teardown, antes
+    # de que se envíe el cuerpo en streaming
+    def close_request_connection(exc):
+        request_connection.close()
+
+    app.teardown_appcontext_funcs.append(close_request_connection)
+    try:
+        with patch("main.mysql.connection", request_connection), \
+                patch("main.MySQLdb.connect", return_value=own_connection):
+            response = client.get("/users")
+            body = response.get_data()
+    finally:
+        app.teardown_appcontext_funcs.remove(close_request_connection)
+
+    assert b"streamed_user" in body
+    assert b"stream-error" not in body
+    assert own_connection.closed
+
+
+def test_list_users_marks_incomplete_listing(mock_mysql, client):
+    mock_mysql.fetchmany.side_effect = [
+        [{"id": 902, "username": "first_user", "email": "f@example.com", "role": "user", "version": 1}]
+        * 500,
+        Exception("Lost connection to MySQL server during query"),
+    ]
+
+    # Simula una sesión autenticada
+    with client.session_transaction() as sess:
+        sess["loggedin"] = True
+        sess["role"] = "admin"
+
+    body = client.get("/users").get_data()
+
+    assert b"first_user" in body
+    assert b"stream-error" in body
+
+
+def test_delete_user_is_audited(mock_mysql, mock_audit, client):
+    # Simula una sesión autenticada
+    with client.session_transaction() as sess:
+        sess["loggedin"] = True
+        sess["username"] = "admin"
+        sess["role"] = "admin"
+
+    client.post("/delete_user/7")
+
+    mock_audit.record.assert_called_once_with("admin", "user.delete", 7, {})
+
+
+def test_delete_user_is_soft(mock_mysql, client):
+    # Simula una sesión autenticada
+    with client.session_transaction() as sess:
+        sess["loggedin"] = True
+        sess["role"] = "admin"
+
+    client.post("/delete_user/7")
+
+    # Solo se marca la fila; el purgador la borra más tarde
+    statements = [c.args[0] for c in mock_mysql.execute.call_args_list]
+    assert not any(sql.startswith("DELETE") for sql in statements)
+    assert any(sql.startswith("UPDATE accounts SET deleted_at") for sql in statements)
+
+
+def test_edit_user_is_audited_without_password(mock_mysql, mock_audit, client):
+    mock_mysql.fetchall.return_value = [
+        {"id": 3, "username": "old_user", "email": "old@example.com", "role": "user", "version": 1}
+    ]
+
+    # Simula una sesión autenticada
+    with client.session_transaction() as sess:
+        sess["loggedin"] = True
+        sess["username"] = "admin"
+        sess["role"] = "admin"
+
+    client.post(
+        "/edit_user/3",
+        data={
+            "username": "updated_user",
+            "email": "updated@example.com",
+            "role": "user",
+            "password": "new_password",
+        },
+    )
+
+    actor, action, target_id, details = mock_audit.record.call_args.args
+    assert (actor, action, target_id) == ("admin", "user.update", 3)
+    assert details["password_changed"] is True
+    assert "new_password" not in str(details)
+
+
+def test_start_and_cancel_job(job_queue, client):
+    # Simula una sesión autenticada
+    with client.session_transaction() as sess:
+        sess["loggedin"] = True
+        sess["role"] = "admin"
+
+    response = client.post("/api/jobs", json={"kind": "export_users"})
+    assert response.status_code == 202
+    job_id = response.get_json()["id"]
+    assert response.headers["Location"] == f"/api/jobs/{job_id}"
+
+    status = client.get(f"/api/jobs/{job_id}").get_json()
+    assert status["status"] == "queued"
+
+    response = client.post(
+        f"/jobs/{job_id}/cancel", headers={"Accept": "application/json"}
+    )
+    assert response.get_json()["status"] == "cancelled"
+
+    page = client.get("/jobs")
+    assert b"export_users" in page.data
+
+
+def test_unknown_job_is_rejected(client):
+    # Simula una sesión autenticada
+    with client.session_transaction() as sess:
+        sess["loggedin"] = True
+        sess["role"] = "admin"
+
+    response = client.post("/api/jobs", json={"kind": "drop_tables"})
+    assert response.status_code == 400
+    # Un cuerpo JSON que no es un objeto también es un 400, no un 500
+    for body in (["export_users"], "export_users", {"kind": ["export_users"]}):
+        assert client.post("/api/jobs", json=body).status_code == 400
+
+
+def test_dashboard_reads_materialized_summary(mock_mysql, client):
+    mock_mysql.fetchall.return_value = [
+        {"role": "admin", "total": 2},
+        {"role": "user", "total": 40},
+    ]
+
+    # Simula una sesión autenticada
+    with client.session_transaction() as sess:
+        sess["loggedin"] = True
+        sess["role"] = "admin"
+
+    response = client.get("/dashboard")
+
+    assert response.status_code == 200
+    assert b"42" in response.data
+    # Solo se lee la tabla de resumen, sin recorrer accounts
+    mock_mysql.execute.assert_called_once_with("SELECT role, total FROM account_summary")
+
+
+def test_dashboard_commits_fallback_rebuild(mock_mysql, client):
+    # Resumen vacío: se recalcula una vez y se guarda
+    mock_mysql.fetchall.side_effect = [[], [{"role": "user", "total": 3}]]
+
+    # Simula una sesión autenticada
+    with client.session_transaction() as sess:
+        sess["loggedin"] = True
+        sess["role"] = "admin"
+
+    with patch("main.db.commit") as commit:
+        response = client.get("/dashboard")
+
+    assert response.status_code == 200
+    mock_mysql.executemany.assert_called_once()
+    commit.assert_called_once()
+
+
+def test_add_user_updates_summary(mock_mysql, client):
+    mock_mysql.fetchone.return_value = None  # Sin duplicados
+
+    # Simula una sesión autenticada
+    with client.session_transaction() as sess:
+        sess["loggedin"] = True
+        sess["role"] = "admin"
+
+    client.post(
+        "/add_user",
+        data={
+            "username": "new_user",
+            "password": "secure_password",
+            "email": "new_user@example.com",
+            "role": "admin",
+        },
+    )
+
+    # La fila caliente del resumen se bloquea lo más tarde posible; solo la sigue el evento
+    statements = [c.args[0] for c in mock_mysql.execute.call_args_list]
+    assert statements[-1].startswith("INSERT INTO account_events")
+    assert statements[-2].startswith("INSERT INTO account_summary")
+    assert statements[-3].startswith("INSERT INTO accounts")
+
+
+def test_search_users(mock_mysql, client):
+    mock_mysql.fetchall.return_value = [
+        {"id": 4, "username": "test_user", "email": "test@example.com", "role": "user"}
+    ]
+
+    # Simula una sesión autenticada
+    with client.session_transaction() as sess:
+        sess["loggedin"] = True
+        sess["role"] = "admin"
+
+    response = client.get("/api/users/search?q=test&limit=1000")
+
+    assert response.get_json() == [
+        {
+            "id": 4,
+            "username": "test_user",
+            "email": "test@example.com",
+            "role": "user",
+            "edit_url": "/edit_user/4",
+        }
+    ]
+    # El límite se acota en el servidor
+    assert mock_mysql.execute.call_args.args[1][-1] == 50
+
+
+def test_search_users_short_query_skips_database(mock_mysql, client):
+    # Simula una sesión autenticada
+    with client.session_transaction() as sess:
+        sess["loggedin"] = True
+        sess["role"] = "admin"
+
+    response = client.get("/api/users/search?q=a")
+
+    assert response.get_json() == []
+    mock_mysql.execute.assert_not_called()
+
+
+def test_edit_user_duplicate_email_single_query(mock_mysql, client):
+    mock_mysql.fetchall.return_value = [
+        {"id": 1, "username": "test_user", "email": "test@example.com", "role": "user", "version": 1},
+        {"id": 2, "username": "other_user", "email": "Taken@example.com", "role": "user", "version": 1},
+    ]
+
+    # Simula una sesión autenticada
+    with client.session_transaction() as sess:
+        sess["loggedin"] = True
+        sess["role"] = "admin"
+
+    response = client.post(
+        "/edit_user/1",
+        data={
+            "username": "test_user",
+            "email": "taken@example.com",
+            "role": "user",
+            "password": "",
+        },
+    )
+
+    assert b"Email already exists" in response.data
+    mock_mysql.execute.assert_called_once()
+
+
+def test_edit_user_round_trips(mock_mysql, client):
+    mock_mysql.fetchall.return_value = [
+        {"id": 1, "username": "test_user", "email": "test@example.com", "role": "user", "version": 1}
+    ]
+
+    # Simula una sesión autenticada
+    with client.session_transaction() as sess:
+        sess["loggedin"] = True
+        sess["role"] = "admin"
+
+    client.post(
+        "/edit_user/1",
+        data={
+            "username": "renamed_user",
+            "email": "test@example.com",
+            "role": "user",
+            "password": "",
+        },
+    )
+
+    # Comprobación de duplicados + UPDATE + evento; el rol no cambia, el resumen no se toca
+    assert mock_mysql.execute.call_count == 3
+
+
+def test_edit_user_not_found(mock_mysql, client):
+    mock_mysql.fetchall.return_value = []
+
+    # Simula una sesión autenticada
+    with client.session_transaction() as sess:
+        sess["loggedin"] = True
+        sess["role"] = "admin"
+
+    response = client.post(
+        "/edit_user/9",
+        data={"username": "ghost", "email": "ghost@example.com", "role": "user", "password": ""},
+    )
+
+    assert b"User with ID 9 not found" in response.data
+
+
+def test_open_circuit_fails_fast(mock_mysql, client):
+    from main import db, standalone_db
+    from shared.circuit_breaker import CircuitBreaker
+
+    breaker = CircuitBreaker(min_calls=1, open_seconds=30)
+    breaker.record(0, failed=True)
+
+    # Simula una sesión autenticada
+    with client.session_transaction() as sess:
+        sess["loggedin"] = True
+        sess["role"] = "admin"
+
+    with patch.object(db, "breaker", breaker), patch.object(standalone_db, "breaker", breaker):
+        response = client.get("/users")
+        api_response = client.get("/api/users/search?q=test")
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "30"
+    assert api_response.status_code == 503
+    mock_mysql.execute.assert_not_called()
+
+
+def test_only_connection_errors_trip_the_circuit(mock_mysql, client):
+    import MySQLdb
+    from main import db
+    from shared import circuit_breaker
+    from shared.db import breaker_from_env
+
+    with patch.dict("os.environ", {"DB_BREAKER_MIN_CALLS": "1", "DB_BREAKER_WINDOW": "1"}):
+        breaker = breaker_from_env()
+
+    with patch.object(db, "breaker", breaker):
+        # Un interbloqueo o un tiempo de espera de bloqueo son respuestas del servidor
+        for code in (1213, 1205, 1054):
+            mock_mysql.execute.side_effect = MySQLdb.OperationalError(code, "answered")
+            with pytest.raises(MySQLdb.OperationalError):
+                db.cursor().execute("SELECT 1")
+        assert breaker.state == circuit_breaker.CLOSED
+
+        mock_mysql.execute.side_effect = MySQLdb.OperationalError(2013, "Lost connection")
+        with pytest.raises(MySQLdb.OperationalError):
+            db.cursor().execute("SELECT 1")
+        assert breaker.state == circuit_breaker.OPEN
+
+
+def test_healthz_does_not_touch_database(mock_mysql, client):
+    response = client.get("/healthz")
+
+    assert response.status_code == 200
+    assert response.get_json() == {"status": "ok"}
+    mock_mysql.execute.assert_not_called()
+
+
+def test_readyz_waits_for_warm_up(client):
+    from shared.warmup import WarmUp
+
+    with patch("main.warmup", WarmUp()) as warmup:
+        assert client.get("/readyz").status_code == 503
+
+        warmup.run()
+        response = client.get("/readyz")
+
+    assert response.status_code == 200
+    assert response.get_json()["ready"] is True
+
+
+def test_warm_user_rows_fills_fragment_cache(mock_mysql):
+    from main import user_row_cache, warm_user_rows
+
+    user_row_cache.clear()
+    mock_mysql.fetchall.return_value = [
+        {"id": 1, "username": "alice", "email": "alice@example.com", "role": "user", "version": 1},
+        {"id": 2, "username": "bob", "email": "bob@example.com", "role": "admin", "version": 1},
+    ]
+
+    assert warm_user_rows() == 2
+    assert len(user_row_cache) == 2
+
+
+def test_request_is_traced(mock_mysql, client):
+    from shared import tracing
+
+    class ListExporter:
+        spans = []
+
+        def export(self, spans):
+            self.spans.extend(span.to_dict() for span in spans)
+
+    exporter = ListExporter()
+    tracing.set_tracer(tracing.Tracer("admin-service", exporter))
+    try:
+        # Simula una sesión autenticada
+        with client.session_transaction() as sess:
+            sess["loggedin"] = True
+            sess["role"] = "admin"
+        mock_mysql.fetchall.return_value = [{"role": "admin", "total": 1}]
+        response = client.get(
+            "/dashboard",
+            headers={"traceparent": "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"},
+        )
+        # El servidor WSGI cierra la respuesta; el cliente de pruebas no
+        response.close()
+    finally:
+        tracing.set_tracer(None)
+
+    assert response.status_code == 200
+    assert response.headers["traceparent"].startswith("00-4bf92f3577b34da6a3ce929d0e0e4736-")
+    names = [span["name"] for span in exporter.spans]
+    assert "SELECT" in names
+    assert "render dashboard.html" in names
+    assert names[-1] == "GET /dashboard"
+    assert {span["traceId"] for span in exporter.spans} == {"4bf92f3577b34da6a3ce929d0e0e4736"}
+
+
+def test_streamed_page_spans_belong_to_request(mock_mysql, client):
+    from shared import tracing
+
+    class ListExporter:
+        spans = []
+
+        def export(self, spans):
+            self.spans.extend(span.to_dict() for span in spans)
+
+    exporter = ListExporter()
+    mock_mysql.fetchmany.return_value = []
+    tracing.set_tracer(tracing.Tracer("admin-service", exporter))
+    try:
+        # Simula una sesión autenticada
+        with client.session_transaction() as sess:
+            sess["loggedin"] = True
+            sess["role"] = "admin"
+        response = client.get("/users")
+        response.get_data()
+        # El span de la petición termina al cerrar la respuesta, no en el teardown
+        assert exporter.spans == []
+        response.close()
+    finally:
+        tracing.set_tracer(None)
+
+    by_name = {span["name"]: span for span in exporter.spans}
+    request_span = by_name["GET /users"]
+    assert by_name["FETCH"]["parentSpanId"] == request_span["spanId"]
+    assert {span["traceId"] for span in exporter.spans} == {request_span["traceId"]}
+
+
+def test_profile_token_captures_request(mock_mysql, client, tmp_path):
+    from main import request_profiler
+
+    with patch.object(request_profiler, "token", "s3cret"), \
+            patch.object(request_profiler, "directory", str(tmp_path)):
+        client.get("/healthz", headers={"X-Profile-Token": "wrong"})
+        assert request_profiler.list() == []
+
+        client.get("/healthz", headers={"X-Profile-Token": "s3cret"})
+        [profile] = request_profiler.list()
+
+        # Simula una sesión autenticada
+        with client.session_transaction() as sess:
+            sess["loggedin"] = True
+            sess["role"] = "admin"
+
+        listing = client.get("/profiles")
+        report = client.get(f"/profiles/{profile['name']}?format=text")
+        download = client.get(f"/profiles/{profile['name']}")
+        missing = client.get("/profiles/nothing.pstats")
+
+    assert profile["service"] == "admin-service"
+    assert profile["name"].encode() in listing.data
+    assert b"cumulative" in report.data
+    assert download.headers["Content-Disposition"].startswith("attachment")
+    assert missing.status_code == 404
+
+
+def test_profiles_require_admin(client):
+    response = client.get("/profiles")
+
+    assert response.status_code == 302
+
+
+def test_login_records_activity_without_writing(mock_mysql, login_activity, client):
+    mock_mysql.fetchone.return_value = {"id": 3, "username": "admin", "role": "admin"}
+
+    client.post("/login", data={"username": "admin", "password": "secret"})
+
+    # Se acumula en memoria y se escribe después en lote
+    assert login_activity.overlay({"id": 3, "login_count": 0})["login_count"] == 1
+    statements = [c.args[0] for c in mock_mysql.execute.call_args_list]
+    assert not any(sql.startswith("UPDATE") for sql in statements)
+
+
+def test_edit_user_stale_form_shows_conflict(mock_mysql, client):
+    mock_mysql.fetchall.return_value = [
+        {"id": 1, "username": "test_user", "email": "new@example.com", "role": "user", "version": 3}
+    ]
+
+    # Simula una sesión autenticada
+    with client.session_transaction() as sess:
+        sess["loggedin"] = True
+        sess["role"] = "admin"
+
+    response = client.post(
+        "/edit_user/1",
+        data={
+            "username": "test_user",
+            "email": "test@example.com",
+            "role": "user",
+            "password": "",
+            "version": "2",
+        },
+    )
+
+    # El formulario se basa en la versión 2; se muestran los valores actuales
+    assert response.status_code == 409
+    assert b"changed by someone else" in response.data
+    assert b'value="new@example.com"' in response.data
+    assert b'name="version" value="3"' in response.data
+    statements = [c.args[0] for c in mock_mysql.execute.call_args_list]
+    assert not any(sql.startswith("UPDATE") for sql in statements)
+
+
+def test_edit_user_lost_race_rolls_back(mock_mysql, client):
+    row = {"id": 1, "username": "test_user", "email": "test@example.com", "role": "user", "version": 1}
+    mock_mysql.fetchall.return_value = [row]
+    mock_mysql.fetchone.return_value = dict(row, version=2)
+    mock_mysql.rowcount = 0  # Otro administrador guardó antes
+
+    # Simula una sesión autenticada
+    with client.session_transaction() as sess:
+        sess["loggedin"] = True
+        sess["role"] = "admin"
+
+    with patch("main.db.rollback") as rollback, patch("main.db.commit") as commit:
+        response = client.post(
+            "/edit_user/1",
+            data={"username": "test_user", "email": "test@example.com", "role": "admin",
+                  "password": "", "version": "1"},
+        )
+
+    assert response.status_code == 409
+    rollback.assert_called_once()
+    commit.assert_not_called()
+
+
+def test_api_user_etag_round_trip(mock_mysql, client):
+    mock_mysql.fetchone.return_value = {
+        "id": 1, "username": "test_user", "email": "test@example.com", "role": "user", "version": 4
+    }
+    mock_mysql.fetchall.return_value = [mock_mysql.fetchone.return_value]
+
+    # Simula una sesión autenticada
+    with client.session_transaction() as sess:
+        sess["loggedin"] = True
+        sess["role"] = "admin"
+
+    response = client.get("/api/users/1")
+    assert response.headers["ETag"] == '"4"'
+    assert client.get("/api/users/1", headers={"If-None-Match": '"4"'}).status_code == 304
+
+    body = {"username": "test_user", "email": "test@example.com", "role": "admin"}
+    missing = client.put("/api/users/1", json=body)
+    stale = client.put("/api/users/1", json=body, headers={"If-Match": '"3"'})
+    saved = client.put("/api/users/1", json=body, headers={"If-Match": '"4"'})
+
+    assert missing.status_code == 428
+    assert stale.status_code == 412
+    assert stale.headers["ETag"] == '"4"'
+    assert saved.status_code == 200
+    assert saved.headers["ETag"] == '"5"'
+    assert saved.get_json()["role"] == "admin"
+    statements = [c.args for c in mock_mysql.execute.call_args_list]
+    update_sql, params = next(args for args in statements if args[0].startswith("UPDATE accounts"))
+    assert "version = version + 1" in update_sql
+    assert params[-1] == 4
+    # El cambio de rol toca el resumen justo antes del evento, la última sentencia
+    assert statements[-2][0].startswith("UPDATE account_summary")
+    assert statements[-2][1] == ("admin", "user", "admin")
+    assert statements[-1][0].startswith("INSERT INTO account_events")
+
+
+def test_api_user_rejects_bad_bodies_and_reports_errors_as_json(mock_mysql, client):
+    # Simula una sesión autenticada
+    with client.session_transaction() as sess:
+        sess["loggedin"] = True
+        sess["role"] = "admin"
+
+    headers = {"If-Match": "*"}
+    for body in (["test_user"], "test_user", {"username": 1, "email": "a@b.com", "role": "user"}):
+        response = client.put("/api/users/1", json=body, headers=headers)
+        assert response.status_code == 400
+        assert "error" in response.get_json()
+
+    mock_mysql.execute.side_effect = Exception("Database error")
+    loaded = client.get("/api/users/903")
+    saved = client.put(
+        "/api/users/903",
+        json={"username": "test_user", "email": "test@example.com", "role": "user"},
+        headers=headers,
+    )
+
+    assert loaded.status_code == 500
+    assert "error" in loaded.get_json()
+    assert saved.status_code == 500
+    assert "error" in saved.get_json()
+
+
+def test_overloaded_service_sheds_with_retry_after(admission_control, client):
+    from shared import admission
+
+    with patch.object(admission_control, "limit", 1), \
+            patch.object(admission_control, "max_queue", 0):
+        admission_control.acquire(admission.NORMAL)  # Ocupa el único hueco
+        try:
+            shed = client.get("/users")
+            probe = client.get("/healthz")
+            metrics = client.get("/metrics")
+        finally:
+            admission_control.release()
+
+    assert shed.status_code == 503
+    assert shed.headers["Retry-After"]
+    assert probe.status_code == 200
+    assert b'admission_shed_total{priority="normal",reason="queue_full"}' in metrics.data
+
+
+def event_row(seq, event_type="account.created"):
+    from datetime import datetime
+
+    return {
+        "seq": seq,
+        "event_type": event_type,
+        "account_id": 7,
+        "payload": '{"username": "new_user"}',
+        "created_at": datetime(2026, 1, 1, 12, 0),
+        "settled": 1,
+    }
+
+
+def test_add_user_writes_event_before_commit(mock_mysql, client):
+    mock_mysql.fetchone.return_value = None  # Sin duplicados
+    mock_mysql.lastrowid = 7
+
+    # Simula una sesión autenticada
+    with client.session_transaction() as sess:
+        sess["loggedin"] = True
+        sess["role"] = "admin"
+
+    with patch("main.db.commit") as commit:
+        client.post(
+            "/add_user",
+            data={"username": "new_user", "password": "secure_password",
+                  "email": "new_user@example.com", "role": "user"},
+        )
+
+    # El evento es la última sentencia: su número se reserva justo antes del commit
+    sql, params = mock_mysql.execute.call_args_list[-1].args
+    assert sql.startswith("INSERT INTO account_events")
+    assert params[:2] == ("account.created", 7)
+    commit.assert_called_once()
+
+
+def test_events_long_poll(events_cursor, mock_mysql, client):
+    events_cursor.fetchall.side_effect = [[], [event_row(5), event_row(6, "account.deleted")]]
+
+    # Simula una sesión autenticada
+    with client.session_transaction() as sess:
+        sess["loggedin"] = True
+        sess["role"] = "admin"
+
+    with patch.dict(app.config, {"EVENTS_POLL_INTERVAL": 0}):
+        response = client.get("/api/events?after=4&wait=5")
+
+    body = response.get_json()
+    assert [event["seq"] for event in body["events"]] == [5, 6]
+    assert body["events"][0]["data"] == {"username": "new_user"}
+    assert body["last_seq"] == 6
+    assert events_cursor.execute.call_args.args[1][1] == 4
+    # Una conexión por consulta, cerrada antes de esperar; la de la petición no se usa
+    assert events_cursor.connect.return_value.close.call_count == 2
+    mock_mysql.execute.assert_not_called()
+
+
+def test_events_limit_is_clamped_and_errors_are_json(events_cursor, client):
+    events_cursor.fetchall.return_value = []
+
+    with patch.dict(app.config, {"EVENTS_TOKEN": "s3cret"}):
+        headers = {"Authorization": "Bearer s3cret"}
+        client.get("/api/events?limit=-1", headers=headers)
+        assert events_cursor.execute.call_args.args[1][2] == 1
+
+        events_cursor.execute.side_effect = Exception("syntax error")
+        response = client.get("/api/events", headers=headers)
+
+    assert response.status_code == 500
+    assert "error" in response.get_json()
+
+
+def test_event_consumers_have_their_own_cap(events_cursor, admission_control, client):
+    from main import feed_admission
+    from shared import admission
+
+    events_cursor.fetchall.return_value = []
+    with patch.object(feed_admission, "limit", 1), \
+            patch.dict(app.config, {"EVENTS_TOKEN": "s3cret"}):
+        feed_admission.acquire(admission.LOW)  # Un consumidor ocupa el feed
+        try:
+            response = client.get("/api/events", headers={"Authorization": "Bearer s3cret"})
+            # Las páginas de administración no compiten con el feed
+            assert client.get("/healthz").status_code == 200
+            assert admission_control.active == 0
+        finally:
+            feed_admission.release()
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"]
+
+
+def test_events_require_token_or_admin(events_cursor, client):
+    assert client.get("/api/events").status_code == 401
+
+    with patch.dict(app.config, {"EVENTS_TOKEN": "s3cret"}):
+        response = client.get("/api/events", headers={"Authorization": "Bearer s3cret"})
+
+    assert response.status_code == 200
+
+
+def test_event_stream_resumes_from_last_event_id(events_cursor, client):
+    events_cursor.fetchall.return_value = [event_row(9)]
+
+    # Simula una sesión autenticada
+    with client.session_transaction() as sess:
+        sess["loggedin"] = True
+        sess["role"] = "admin"
+
+    with patch.dict(app.config, {"EVENTS_MAX_WAIT": 0.01, "EVENTS_POLL_INTERVAL": 0}):
+        response = client.get("/api/events/stream", headers={"Last-Event-ID": "8"})
+        body = response.get_data(as_text=True)
+
+    assert response.mimetype == "text/event-stream"
+    assert "id: 9\nevent: account.created\n" in body
+    assert events_cursor.execute.call_args_list[0].args[1][1] == 8
+
+
+def test_sigterm_flushes_audit_log_and_login_activity(mock_audit, login_activity):
+    from main import shutdown
+
+    # docker stop envía SIGTERM al PID 1: hay que vaciar las colas antes de salir
+    with patch.object(login_activity, "close") as close_activity:
+        with pytest.raises(SystemExit):
+            shutdown(signal.SIGTERM, None)
+    mock_audit.close.assert_called_once_with()
+    close_activity.assert_called_once_with()
@@ -0,0 +1,124 @@
+import sqlite3
+import subprocess
+import sys
+import time
+
+import pytest
+import jobs
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return jobs.JobQueue(str(tmp_path / "jobs.sqlite3"))
+
+
+def test_claim_returns_oldest_queued_job(queue):
+    first = queue.enqueue("export_users")
+    queue.enqueue("export_users")
+
+    claimed = queue.claim()
+
+    assert claimed["id"] == first
+    assert queue.get(first)["status"] == jobs.RUNNING
+
+
+def test_claim_empty_queue(queue):
+    assert queue.claim() is None
+
+
+def test_unknown_job_kind_is_rejected(queue):
+    with pytest.raises(ValueError):
+        queue.enqueue("drop_tables")
+
+
+def test_cancel_queued_job(queue):
+    job_id = queue.enqueue("export_users")
+
+    assert queue.cancel(job_id)["status"] == jobs.CANCELLED
+    assert queue.claim() is None
+
+
+def test_cancel_running_job_stops_at_next_progress_report(queue, tmp_path):
+    jobs.HANDLERS["test_slow"] = slow_handler
+    try:
+        job_id = queue.enqueue("test_slow")
+        job_row = queue.claim()
+        queue.cancel(job_id)
+
+        jobs.run_job(queue, job_row, str(tmp_path), {})
+    finally:
+        del jobs.HANDLERS["test_slow"]
+
+    job = queue.get(job_id)
+    assert job["status"] == jobs.CANCELLED
+    assert job["progress"] == 0.5
+
+
+def test_failed_job_records_error(queue, tmp_path):
+    jobs.HANDLERS["test_broken"] = broken_handler
+    try:
+        job_id = queue.enqueue("test_broken")
+        jobs.run_job(queue, queue.claim(), str(tmp_path), {})
+    finally:
+        del jobs.HANDLERS["test_broken"]
+
+    job = queue.get(job_id)
+    assert job["status"] == jobs.FAILED
+    assert job["message"] == "boom"
+
+
+def test_claim_fails_job_of_dead_worker(queue):
+    job_id = queue.enqueue("export_users")
+    queue.claim()
+    # Un proceso que ya ha terminado hace de worker caído
+    worker = subprocess.Popen([sys.executable, "-c", "pass"])
+    worker.wait()
+    with sqlite3.connect(queue.path) as conn:
+        conn.execute("UPDATE jobs SET worker_pid = ? WHERE id = ?", (worker.pid, job_id))
+
+    assert queue.claim() is None
+    job = queue.get(job_id)
+    assert job["status"] == jobs.FAILED
+    assert job["finished_at"] is not None
+
+
+def test_claim_ends_jobs_without_recent_heartbeat(queue):
+    stuck = queue.enqueue("export_users")
+    cancelled = queue.enqueue("export_users")
+    healthy = queue.enqueue("export_users")
+    for _ in range(3):
+        queue.claim()
+    queue.cancel(cancelled)
+    with sqlite3.connect(queue.path) as conn:
+        conn.execute(
+            "UPDATE jobs SET heartbeat_at = ? WHERE id IN (?, ?)",
+            (time.time() - queue.stale_after - 1, stuck, cancelled),
+        )
+    queue.report(healthy, 0.1)
+
+    queue.claim()
+
+    assert queue.get(stuck)["status"] == jobs.FAILED
+    assert queue.get(cancelled)["status"] == jobs.CANCELLED
+    assert queue.get(healthy)["status"] == jobs.RUNNING
+
+
+def test_queue_file_without_heartbeat_column_is_upgraded(tmp_path):
+    path = str(tmp_path / "old.sqlite3")
+    with sqlite3.connect(path) as conn:
+        conn.executescript(jobs.SCHEMA.replace("    heartbeat_at REAL,\n", ""))
+
+    queue = jobs.JobQueue(path)
+    job_id = queue.enqueue("export_users")
+    queue.claim()
+
+    assert queue.get(job_id)["heartbeat_at"] is not None
+
+
+def slow_handler(ctx):
+    ctx.progress(0.5, "halfway")
+    raise AssertionError("job should have been cancelled")
+
+
+def broken_handler(ctx):
+    raise RuntimeError("boom")
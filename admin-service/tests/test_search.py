@@ -0,0 +1,68 @@
+import search
+
+
+def make_index():
+    index = search.PrefixIndex()
+    index.rebuild(
+        [
+            {"id": 1, "username": "alice", "email": "alice@example.com", "role": "admin"},
+            {"id": 2, "username": "albert", "email": "bert@corp.io", "role": "user"},
+            {"id": 3, "username": "bob", "email": "bob@example.com", "role": "user"},
+        ]
+    )
+    return index
+
+
+def test_prefix_matches_username_and_email():
+    index = make_index()
+
+    assert [r["id"] for r in index.search("al", 10)] == [2, 1]
+    assert [r["id"] for r in index.search("BER", 10)] == [2]
+
+
+def test_domain_search():
+    index = make_index()
+
+    assert [r["id"] for r in index.search("@example", 10)] == [1, 3]
+    # Dominios parciales, igual que el backend MySQL (email_domain LIKE 'exa%')
+    assert [r["id"] for r in index.search("@exa", 10)] == [1, 3]
+    assert index.search("@ample", 10) == []
+
+
+def test_remove_and_update():
+    index = make_index()
+    index.remove(1)
+    index.add({"id": 3, "username": "robert", "email": "rob@corp.io", "role": "user"})
+
+    assert index.search("alice", 10) == []
+    assert index.search("bob", 10) == []
+    assert [r["id"] for r in index.search("@corp", 10)] == [2, 3]
+
+
+def test_limit():
+    assert len(make_index().search("@", 2)) == 2
+
+
+def test_clamp_limit():
+    assert search.clamp_limit("500") == search.MAX_LIMIT
+    assert search.clamp_limit("0") == 1
+    assert search.clamp_limit(None) == search.DEFAULT_LIMIT
+
+
+def test_large_subtree_keeps_username_order():
+    index = search.PrefixIndex()
+    rows = [
+        {"id": i, "username": f"user{(i * 37) % 120:03d}", "email": f"u{i}@example.com", "role": "user"}
+        for i in range(120)
+    ]
+    index.rebuild(rows)
+    expected = sorted(rows, key=lambda row: row["username"])
+
+    assert index.search("us", 10) == expected[:10]
+    assert index.search("@example", search.MAX_LIMIT) == expected[:search.MAX_LIMIT]
+    assert index.search("u", 100) == expected[:100]
+
+    # Al quitar una de las primeras filas se rellena con la siguiente
+    index.remove(expected[0]["id"])
+    assert index.search("us", 10) == expected[1:11]
+    assert len(index.search("@example", search.MAX_LIMIT)) == search.MAX_LIMIT
@@ -0,0 +1,36 @@
+#!/usr/bin/env bash
+# Measure container start to first successful /healthz response.
+#
+# Usage: benchmarks/startup_time.sh <image> [runs]
+# Prints one JSON object with the image size and per-run/median startup times.
+set -euo pipefail
+
+image="$1"
+runs="${2:-5}"
+timeout_s=60
+
+now_ms() { date +%s%3N; }
+
+times=()
+for _ in $(seq "$runs"); do
+    start=$(now_ms)
+    container=$(docker run -d -p 127.0.0.1::5000 -e SECRET_KEY=startup-benchmark "$image")
+    port=$(docker port "$container" 5000/tcp | head -n1 | cut -d: -f2)
+    deadline=$((start + timeout_s * 1000))
+    until curl -fsS -o /dev/null "http://127.0.0.1:${port}/healthz"; do
+        if [ "$(now_ms)" -gt "$deadline" ]; then
+            docker logs "$container" >&2
+            docker rm -f "$container" >/dev/null
+            echo "timed out waiting for /healthz" >&2
+            exit 1
+        fi
+        sleep 0.05
+    done
+    times+=($(( $(now_ms) - start )))
+    docker rm -f "$container" >/dev/null
+done
+
+median=$(printf '%s\n' "${times[@]}" | sort -n | awk '{a[NR]=$1} END {print a[int((NR + 1) / 2)]}')
+size=$(docker image inspect "$image" --format '{{.Size}}')
+printf '{"image": "%s", "size_bytes": %s, "startup_ms": [%s], "median_startup_ms": %s}\n' \
+    "$image" "$size" "$(IFS=,; echo "${times[*]}")" "$median"
@@ -0,0 +1 @@
+"""Code shared by admin-service and user-service."""
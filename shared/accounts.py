@@ -0,0 +1,218 @@
+"""Queries on the ``accounts`` table shared by both services.
+
+Deleting an account only stamps ``deleted_at``; every read here skips those
+rows, so callers never see them. ``Purger`` removes stamped rows later in
+small, throttled batches, keeping long row locks out of the request path.
+"""
+import hashlib
+import threading
+
+from shared import tracing
+
+PUBLIC_COLUMNS = "id, username, email, role, version, last_login, login_count"
+
+# Condition every query on live accounts must include
+LIVE = "deleted_at IS NULL"
+
+
+def hash_password(password):
+    with tracing.span("password.hash", attributes={"hash.algorithm": "sha1"}):
+        return hashlib.sha1(password.encode()).hexdigest()
+
+
+def get(cursor, account_id):
+    cursor.execute(
+        f"SELECT {PUBLIC_COLUMNS} FROM accounts WHERE id = %s AND {LIVE}", (account_id,)
+    )
+    return cursor.fetchone()
+
+
+def authenticate(cursor, username, password_hash):
+    cursor.execute(
+        f"SELECT {PUBLIC_COLUMNS} FROM accounts "
+        f"WHERE username = %s AND password = %s AND {LIVE}",
+        (username, password_hash),
+    )
+    return cursor.fetchone()
+
+
+def username_taken(cursor, username):
+    cursor.execute(f"SELECT id FROM accounts WHERE username = %s AND {LIVE}", (username,))
+    return cursor.fetchone() is not None
+
+
+def email_taken(cursor, email):
+    cursor.execute(f"SELECT id FROM accounts WHERE email = %s AND {LIVE}", (email,))
+    return cursor.fetchone() is not None
+
+
+def select_all(cursor, limit=None):
+    """Execute the listing query; the caller fetches (or streams) the rows."""
+    if limit is None:
+        cursor.execute(f"SELECT {PUBLIC_COLUMNS} FROM accounts WHERE {LIVE}")
+    else:
+        cursor.execute(
+            f"SELECT {PUBLIC_COLUMNS} FROM accounts WHERE {LIVE} LIMIT %s", (limit,)
+        )
+
+
+def recent(cursor, limit):
+    """Accounts that logged in most recently."""
+    cursor.execute(
+        f"SELECT {PUBLIC_COLUMNS} FROM accounts WHERE {LIVE} ORDER BY last_login DESC LIMIT %s",
+        (limit,),
+    )
+    return cursor.fetchall()
+
+
+def count(cursor):
+    cursor.execute(f"SELECT COUNT(*) FROM accounts WHERE {LIVE}")
+    return cursor.fetchone()[0]
+
+
+def count_by_role(cursor):
+    """``{role: total}`` for roles that have live accounts (full scan)."""
+    cursor.execute(f"SELECT role, COUNT(*) AS total FROM accounts WHERE {LIVE} GROUP BY role")
+    return {row["role"]: row["total"] for row in cursor.fetchall()}
+
+
+def select_for_export(cursor):
+    """Execute the export query (no password hashes); the caller streams the rows."""
+    cursor.execute(f"SELECT id, username, email, role FROM accounts WHERE {LIVE} ORDER BY id")
+
+
+def escape_like(value):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def search(cursor, query, limit):
+    """Accounts whose username or email starts with ``query``.
+
+    ``@domain`` queries match the start of the email domain (``@exa`` finds
+    ``@example.com``) through the index on the generated ``email_domain``
+    column, like ``PrefixIndex`` in the admin service.
+    """
+    columns = "id, username, email, role"
+    if query.startswith("@"):
+        cursor.execute(
+            f"SELECT {columns} FROM accounts WHERE email_domain LIKE %s "
+            f"AND {LIVE} ORDER BY email_domain LIMIT %s",
+            (escape_like(query[1:]) + "%", limit),
+        )
+        return list(cursor.fetchall())
+    # One index range scan per column; a single OR would defeat both indexes
+    pattern = escape_like(query) + "%"
+    cursor.execute(
+        f"(SELECT {columns} FROM accounts WHERE username LIKE %s AND {LIVE} "
+        "ORDER BY username LIMIT %s) "
+        f"UNION (SELECT {columns} FROM accounts WHERE email LIKE %s AND {LIVE} "
+        "ORDER BY email LIMIT %s) "
+        "ORDER BY username LIMIT %s",
+        (pattern, limit, pattern, limit, limit),
+    )
+    return list(cursor.fetchall())
+
+
+def with_identity(cursor, account_id, username, email):
+    """The account plus any other account using ``username`` or ``email``."""
+    cursor.execute(
+        f"SELECT {PUBLIC_COLUMNS} FROM accounts "
+        f"WHERE (id = %s OR username = %s OR email = %s) AND {LIVE}",
+        (account_id, username, email),
+    )
+    return cursor.fetchall()
+
+
+def create(cursor, username, password_hash, email, role):
+    cursor.execute(
+        "INSERT INTO accounts (username, password, email, role) VALUES (%s, %s, %s, %s)",
+        (username, password_hash, email, role),
+    )
+    return cursor.lastrowid
+
+
+def update(cursor, account_id, version, username, email, role, password_hash=None):
+    """Compare-and-swap update: applies only if the row is still at ``version``.
+
+    Returns False when another writer got there first (or the account is
+    gone); on success the row moves to ``version + 1``.
+    """
+    if password_hash:
+        cursor.execute(
+            "UPDATE accounts SET username = %s, email = %s, role = %s, password = %s, "
+            f"version = version + 1 WHERE id = %s AND version = %s AND {LIVE}",
+            (username, email, role, password_hash, account_id, version),
+        )
+    else:
+        cursor.execute(
+            "UPDATE accounts SET username = %s, email = %s, role = %s, "
+            f"version = version + 1 WHERE id = %s AND version = %s AND {LIVE}",
+            (username, email, role, account_id, version),
+        )
+    return cursor.rowcount == 1
+
+
+def soft_delete(cursor, account_id):
+    cursor.execute(
+        f"UPDATE accounts SET deleted_at = NOW() WHERE id = %s AND {LIVE}", (account_id,)
+    )
+    return cursor.rowcount
+
+
+def purge_deleted(cursor, batch_size):
+    """Hard-delete up to ``batch_size`` soft-deleted rows, oldest first."""
+    cursor.execute(
+        "DELETE FROM accounts WHERE deleted_at IS NOT NULL ORDER BY deleted_at LIMIT %s",
+        (batch_size,),
+    )
+    return cursor.rowcount
+
+
+class Purger:
+    """Background thread that removes soft-deleted accounts.
+
+    Every ``interval`` seconds it deletes batches of ``batch_size`` rows, one
+    short transaction each, pausing ``pause`` seconds between batches so
+    concurrent logins and edits are not starved of locks.
+    """
+
+    def __init__(self, connect, batch_size=500, pause=0.5, interval=60.0):
+        self._connect = connect
+        self.batch_size = batch_size
+        self.pause = pause
+        self.interval = interval
+        self.purged = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def purge_once(self):
+        total = 0
+        conn = self._connect()
+        try:
+            while True:
+                cursor = conn.cursor()
+                deleted = purge_deleted(cursor, self.batch_size)
+                conn.commit()
+                cursor.close()
+                total += deleted
+                self.purged += deleted
+                if deleted < self.batch_size or self._stop.wait(self.pause):
+                    break
+        finally:
+            conn.close()
+        return total
+
+    def run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.purge_once()
+            except Exception as e:
+                print(f"Error purging deleted accounts: {str(e)}")  # Log the error
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="account-purger", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,143 @@
+"""Login activity (``last_login``, ``login_count``) with coalesced writes.
+
+``LoginActivity.record`` only updates an in-memory buffer keyed by account;
+a background thread flushes it every ``flush_interval`` seconds as one
+multi-row ``UPDATE ... CASE`` per ``batch_size`` accounts. Ten logins of the
+same account within an interval cost a single row update.
+
+Until a flush has committed, ``overlay`` keeps adding its activity to rows
+read before it; ``on_flush`` is then called with the flushed account ids so
+callers can drop copies of those rows they cached.
+"""
+import atexit
+import threading
+from datetime import datetime, timezone
+
+
+class LoginActivity:
+    def __init__(self, connect, flush_interval=5.0, batch_size=500, on_flush=None):
+        self.connect = connect
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.on_flush = on_flush
+        self.failed = 0
+        # account id -> (latest login time, logins since the last flush)
+        self._pending = {}
+        # Activity taken by a flush that has not committed yet
+        self._flushing = {}
+        self._lock = threading.Lock()
+        self._worker = None
+        self._stopping = threading.Event()
+
+    def record(self, account_id, when=None):
+        if when is None:
+            when = datetime.now(timezone.utc).replace(tzinfo=None)
+        with self._lock:
+            last, count = self._pending.get(account_id, (when, 0))
+            self._pending[account_id] = (max(last, when), count + 1)
+        self._ensure_worker()
+
+    def overlay(self, account):
+        """Copy of ``account`` including logins not flushed yet."""
+        if account is None:
+            return None
+        with self._lock:
+            entries = [
+                buffer[account["id"]]
+                for buffer in (self._pending, self._flushing)
+                if account["id"] in buffer
+            ]
+        if not entries:
+            return account
+        last = max(when for when, _ in entries)
+        count = sum(logins for _, logins in entries)
+        previous = account.get("last_login")
+        return dict(
+            account,
+            last_login=max(previous, last) if previous else last,
+            login_count=(account.get("login_count") or 0) + count,
+        )
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._lock:
+            if self._worker is None and not self._stopping.is_set():
+                self._worker = threading.Thread(
+                    target=self._run, name="login-activity", daemon=True
+                )
+                self._worker.start()
+                atexit.register(self.close)
+
+    def _run(self):
+        while not self._stopping.wait(self.flush_interval):
+            self.flush()
+        self.flush()
+
+    def flush(self):
+        """Write buffered activity; returns the number of accounts updated."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._flushing = pending
+        if not pending:
+            return 0
+        items = sorted(pending.items())
+        conn = None
+        try:
+            conn = self.connect()
+            cursor = conn.cursor()
+            for start in range(0, len(items), self.batch_size):
+                cursor.execute(*update_statement(items[start:start + self.batch_size]))
+            conn.commit()
+            cursor.close()
+        except Exception as e:
+            # Put the activity back so the next flush retries it
+            with self._lock:
+                self._flushing = {}
+                for account_id, (last, count) in items:
+                    newer_last, newer_count = self._pending.get(account_id, (last, 0))
+                    self._pending[account_id] = (max(last, newer_last), count + newer_count)
+                self.failed += 1
+            print(f"Error writing login activity: {str(e)}")  # Log the error
+            return 0
+        finally:
+            if conn is not None:
+                conn.close()
+        try:
+            # Drop cached rows before the overlay stops counting this activity
+            if self.on_flush is not None:
+                self.on_flush([account_id for account_id, _ in items])
+        finally:
+            with self._lock:
+                self._flushing = {}
+        return len(items)
+
+    def close(self, timeout=5.0):
+        """Stop the worker after flushing buffered activity."""
+        self._stopping.set()
+        worker = self._worker
+        if worker is not None and worker is not threading.current_thread():
+            worker.join(timeout)
+        elif worker is None:
+            self.flush()
+
+
+def update_statement(items):
+    """One UPDATE for ``[(account_id, (last_login, count)), ...]``."""
+    last_cases = " ".join("WHEN %s THEN %s" for _ in items)
+    count_cases = " ".join("WHEN %s THEN %s" for _ in items)
+    placeholders = ", ".join("%s" for _ in items)
+    sql = (
+        # GREATEST: both services flush independently and may arrive out of order
+        f"UPDATE accounts SET last_login = GREATEST(COALESCE(last_login, '1000-01-01'), "
+        f"CASE id {last_cases} END), "
+        f"login_count = login_count + CASE id {count_cases} END "
+        f"WHERE id IN ({placeholders})"
+    )
+    params = []
+    for account_id, (last, _) in items:
+        params += [account_id, last]
+    for account_id, (_, count) in items:
+        params += [account_id, count]
+    params += [account_id for account_id, _ in items]
+    return sql, tuple(params)
@@ -0,0 +1,178 @@
+"""Admission control: bound concurrent requests and shed the excess early.
+
+``AdmissionMiddleware`` wraps a WSGI app. At most ``limit`` requests run at
+once; the rest wait in a priority queue (higher classes first, FIFO within a
+class) for at most their class's deadline. A request that cannot get a slot
+in time, or finds the queue full, is answered immediately with 503 and
+``Retry-After`` instead of tying up a worker until the client gives up.
+"""
+import heapq
+import itertools
+import json
+import math
+import os
+import threading
+
+HIGH = 0
+NORMAL = 1
+LOW = 2
+PRIORITY_NAMES = {HIGH: "high", NORMAL: "normal", LOW: "low"}
+
+QUEUE_FULL = "queue_full"
+DEADLINE = "deadline"
+
+
+class _Waiter:
+    __slots__ = ("event", "granted", "cancelled")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.granted = False
+        self.cancelled = False
+
+
+class AdmissionController:
+    def __init__(self, limit, max_queue=100, deadlines=None):
+        self.limit = limit
+        self.max_queue = max_queue
+        # Longest time each class may wait for a slot, in seconds
+        self.deadlines = deadlines or {HIGH: 2.0, NORMAL: 1.0, LOW: 0.25}
+        self.active = 0
+        self.admitted = dict.fromkeys(PRIORITY_NAMES, 0)
+        self.shed = {(p, r): 0 for p in PRIORITY_NAMES for r in (QUEUE_FULL, DEADLINE)}
+        self._queue = []
+        self._queued = 0
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        deadlines = [float(x) for x in os.getenv("ADMISSION_DEADLINES", "2,1,0.25").split(",")]
+        return cls(
+            limit=int(os.getenv("ADMISSION_LIMIT", "32")),
+            max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "100")),
+            deadlines=dict(zip((HIGH, NORMAL, LOW), deadlines)),
+        )
+
+    def acquire(self, priority):
+        """Take a slot; returns None when admitted or the reason it was shed."""
+        with self._lock:
+            if self.active < self.limit and not self._queued:
+                self.active += 1
+                self.admitted[priority] += 1
+                return None
+            if self._queued >= self.max_queue:
+                self.shed[priority, QUEUE_FULL] += 1
+                return QUEUE_FULL
+            waiter = _Waiter()
+            heapq.heappush(self._queue, (priority, next(self._order), waiter))
+            self._queued += 1
+        waiter.event.wait(self.deadlines[priority])
+        with self._lock:
+            if waiter.granted:
+                self.admitted[priority] += 1
+                return None
+            # Timed out: leave the entry in the heap, release() skips it
+            waiter.cancelled = True
+            self._queued -= 1
+            self.shed[priority, DEADLINE] += 1
+            return DEADLINE
+
+    def release(self):
+        with self._lock:
+            # Hand the slot straight to the best waiter still interested
+            while self._queue:
+                _, _, waiter = heapq.heappop(self._queue)
+                if not waiter.cancelled:
+                    waiter.granted = True
+                    self._queued -= 1
+                    waiter.event.set()
+                    return
+            self.active -= 1
+
+    def retry_after(self):
+        # Rough time for the current queue to drain
+        return max(1, math.ceil(self.deadlines[NORMAL] * (1 + self._queued / max(self.limit, 1))))
+
+    def metrics(self, prefix="admission"):
+        """Counters in the Prometheus text format."""
+        lines = [
+            f"# TYPE {prefix}_in_flight gauge",
+            f"{prefix}_in_flight {self.active}",
+            f"# TYPE {prefix}_queued gauge",
+            f"{prefix}_queued {self._queued}",
+            f"# TYPE {prefix}_admitted_total counter",
+        ]
+        for priority, name in PRIORITY_NAMES.items():
+            lines.append(f'{prefix}_admitted_total{{priority="{name}"}} {self.admitted[priority]}')
+        lines.append(f"# TYPE {prefix}_shed_total counter")
+        for (priority, reason), count in sorted(self.shed.items()):
+            name = PRIORITY_NAMES[priority]
+            lines.append(f'{prefix}_shed_total{{priority="{name}",reason="{reason}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+class _Release:
+    """Response iterable that frees the slot once the body has been sent."""
+
+    def __init__(self, result, release):
+        self._result = result
+        self._release = release
+
+    def __iter__(self):
+        return iter(self._result)
+
+    def close(self):
+        try:
+            if hasattr(self._result, "close"):
+                self._result.close()
+        finally:
+            release, self._release = self._release, None
+            if release is not None:
+                release()
+
+
+class AdmissionMiddleware:
+    """WSGI wrapper; ``priority_of(path)`` returns a class or None to bypass."""
+
+    def __init__(self, app, controller, priority_of):
+        self.app = app
+        self.controller = controller
+        self.priority_of = priority_of
+
+    def __call__(self, environ, start_response):
+        priority = self.priority_of(environ.get("PATH_INFO", ""))
+        if priority is None or self.controller.limit <= 0:
+            return self.app(environ, start_response)
+        if self.controller.acquire(priority) is not None:
+            return self._reject(environ, start_response)
+        try:
+            result = self.app(environ, start_response)
+        except BaseException:
+            self.controller.release()
+            raise
+        return _Release(result, self.controller.release)
+
+    def _reject(self, environ, start_response):
+        message = "The service is overloaded. Please try again shortly."
+        if environ.get("PATH_INFO", "").startswith("/api/"):
+            body, content_type = json.dumps({"error": message}), "application/json"
+        else:
+            body, content_type = message, "text/plain; charset=utf-8"
+        body = body.encode()
+        start_response(
+            "503 Service Unavailable",
+            [
+                ("Content-Type", content_type),
+                ("Content-Length", str(len(body))),
+                ("Retry-After", str(self.controller.retry_after())),
+            ],
+        )
+        return [body]
+
+
+def install(app, priority_of, controller=None):
+    """Wrap a Flask app's WSGI callable; returns the controller."""
+    controller = controller or AdmissionController.from_env()
+    app.wsgi_app = AdmissionMiddleware(app.wsgi_app, controller, priority_of)
+    return controller
@@ -0,0 +1,186 @@
+"""Asynchronous audit trail.
+
+Request handlers call ``AuditLog.record`` which only enqueues the event; a
+background thread drains the queue and writes events to a sink in batches.
+"""
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+DROP = "drop"
+BLOCK = "block"
+
+
+class FileAuditSink:
+    """Append-only JSON-lines file, rotated once it grows past ``max_bytes``."""
+
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, backup_count=5):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+
+    def write(self, events):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            for event in events:
+                f.write(json.dumps(event, default=str) + "\n")
+            size = f.tell()
+        if self.max_bytes and size >= self.max_bytes:
+            self._rotate()
+
+    def _rotate(self):
+        for i in range(self.backup_count - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backup_count:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+
+class MySQLAuditSink:
+    """Batched multi-row INSERT into the ``audit_log`` table.
+
+    ``connect`` returns a DB-API connection; it is kept open between batches
+    and re-created after an error.
+    """
+
+    INSERT = (
+        "INSERT INTO audit_log (created_at, actor, action, target_id, details) "
+        "VALUES (%s, %s, %s, %s, %s)"
+    )
+
+    def __init__(self, connect):
+        self.connect = connect
+        self._connection = None
+
+    def write(self, events):
+        rows = [
+            (
+                e["time"],
+                e["actor"],
+                e["action"],
+                e["target_id"],
+                json.dumps(e["details"], default=str),
+            )
+            for e in events
+        ]
+        try:
+            if self._connection is None:
+                self._connection = self.connect()
+            cursor = self._connection.cursor()
+            cursor.executemany(self.INSERT, rows)
+            self._connection.commit()
+            cursor.close()
+        except Exception:
+            self._connection = None
+            raise
+
+
+class AuditLog:
+    """Bounded in-process queue of audit events flushed by a background worker.
+
+    When the queue is full the ``drop`` policy discards the new event
+    (counted in ``dropped``) and ``block`` waits up to ``block_timeout``
+    seconds for room before dropping it.
+    """
+
+    def __init__(
+        self,
+        sink,
+        maxsize=10000,
+        batch_size=100,
+        flush_interval=1.0,
+        policy=DROP,
+        block_timeout=0.05,
+    ):
+        if policy not in (DROP, BLOCK):
+            raise ValueError(f"Unknown backpressure policy: {policy}")
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.dropped = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._worker = None
+        self._stopping = threading.Event()
+
+    def record(self, actor, action, target_id=None, details=None):
+        """Enqueue an event; returns False if it was dropped."""
+        event = {
+            "time": datetime.now(timezone.utc).replace(tzinfo=None),
+            "actor": actor,
+            "action": action,
+            "target_id": target_id,
+            "details": details or {},
+        }
+        self._ensure_worker()
+        try:
+            if self.policy == BLOCK:
+                self._queue.put(event, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(event)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        return True
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._lock:
+            if self._worker is None and not self._stopping.is_set():
+                self._worker = threading.Thread(
+                    target=self._run, name="audit-log", daemon=True
+                )
+                self._worker.start()
+                atexit.register(self.close)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._flush_batch(wait=self.flush_interval)
+        # Drain whatever was queued before shutdown
+        while self._flush_batch(wait=0):
+            pass
+
+    def _flush_batch(self, wait):
+        batch = []
+        deadline = time.monotonic() + wait
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                if timeout > 0:
+                    batch.append(self._queue.get(timeout=timeout))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            try:
+                self.sink.write(batch)
+            except Exception as e:
+                with self._lock:
+                    self.failed += len(batch)
+                print(f"Error writing audit events: {str(e)}")  # Log the error
+        return len(batch)
+
+    def close(self, timeout=5.0):
+        """Stop the worker after flushing queued events."""
+        self._stopping.set()
+        worker = self._worker
+        if worker is not None and worker is not threading.current_thread():
+            worker.join(timeout)
+        elif worker is None:
+            while self._flush_batch(wait=0):
+                pass
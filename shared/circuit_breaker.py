@@ -0,0 +1,127 @@
+"""Circuit breaker for calls to a shared dependency (the MySQL server).
+
+The breaker keeps a rolling window of recent call outcomes. Calls that fail
+or take longer than ``slow_call_seconds`` count against it; once their share
+of the window reaches ``failure_rate`` the circuit opens and calls fail
+immediately with ``CircuitOpenError``. After ``open_seconds`` a limited
+number of probe calls are let through (half-open): a healthy probe closes
+the circuit, a bad one opens it again.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, name, retry_after):
+        super().__init__(f"Circuit '{name}' is open")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name="database",
+        failure_rate=0.5,
+        slow_call_seconds=2.0,
+        window=20,
+        min_calls=5,
+        open_seconds=10.0,
+        half_open_calls=1,
+        failure_exceptions=(Exception,),
+        is_failure=None,
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.failure_exceptions = failure_exceptions
+        self._is_failure = is_failure
+        self._outcomes = deque(maxlen=window)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and self._open_elapsed() >= self.open_seconds:
+                return HALF_OPEN
+            return self._state
+
+    def _open_elapsed(self):
+        return time.monotonic() - self._opened_at
+
+    def _open(self):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._probes = 0
+
+    def before_call(self, probe=True):
+        """Raise CircuitOpenError unless a call may go through right now.
+
+        With ``probe=False`` only fail fast while open; no half-open probe
+        slot is taken, so no matching ``record`` is expected.
+        """
+        with self._lock:
+            if self._state == OPEN:
+                elapsed = self._open_elapsed()
+                if elapsed < self.open_seconds:
+                    raise CircuitOpenError(self.name, self.open_seconds - elapsed)
+                self._state = HALF_OPEN
+                self._probes = 0
+            if self._state == HALF_OPEN and probe:
+                if self._probes >= self.half_open_calls:
+                    raise CircuitOpenError(self.name, self.open_seconds)
+                self._probes += 1
+
+    def record(self, duration, failed=False):
+        bad = failed or duration > self.slow_call_seconds
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes = max(self._probes - 1, 0)
+                if bad:
+                    self._open()
+                else:
+                    self._state = CLOSED
+                    self._outcomes.clear()
+                return
+            if self._state == OPEN:
+                return
+            self._outcomes.append(bad)
+            if (
+                len(self._outcomes) >= self.min_calls
+                and sum(self._outcomes) / len(self._outcomes) >= self.failure_rate
+            ):
+                self._open()
+
+    def counts_as_failure(self, exc):
+        """Whether ``exc`` says the dependency is unhealthy.
+
+        Exceptions outside ``failure_exceptions``, or rejected by the optional
+        ``is_failure`` predicate, mean the dependency answered (e.g. a
+        constraint violation) and are not its fault.
+        """
+        if not isinstance(exc, self.failure_exceptions):
+            return False
+        return self._is_failure is None or self._is_failure(exc)
+
+    @contextmanager
+    def call(self):
+        self.before_call()
+        start = time.monotonic()
+        try:
+            yield
+        except BaseException as exc:
+            self.record(time.monotonic() - start, failed=self.counts_as_failure(exc))
+            raise
+        else:
+            self.record(time.monotonic() - start)
@@ -7,9 +7,60 @@ CREATE TABLE IF NOT EXISTS `accounts` (
     `password` varchar(255) NOT NULL,
     `email` varchar(100) NOT NULL,
     `role` ENUM('admin', 'user') DEFAULT 'user',
-    PRIMARY KEY (`id`)
+    -- Bumped by every edit; updates compare-and-swap on it
+    `version` int(11) NOT NULL DEFAULT 1,
+    -- Email domain so domain searches (@exa, @example.com) become index prefix scans
+    `email_domain` varchar(100) AS (SUBSTRING_INDEX(`email`, '@', -1)) STORED,
+    -- Set on delete; the admin service purges these rows in the background
+    `deleted_at` datetime DEFAULT NULL,
+    -- Login activity, written in coalesced batches by both services
+    `last_login` datetime DEFAULT NULL,
+    `login_count` int(11) NOT NULL DEFAULT 0,
+    PRIMARY KEY (`id`),
+    KEY `idx_accounts_username` (`username`),
+    KEY `idx_accounts_email` (`email`),
+    KEY `idx_accounts_email_domain` (`email_domain`),
+    KEY `idx_accounts_deleted_at` (`deleted_at`),
+    KEY `idx_accounts_last_login` (`last_login`)
 ) ENGINE=InnoDB AUTO_INCREMENT=1 DEFAULT CHARSET=utf8;
 
+-- Per-role account counts maintained incrementally by both services
+CREATE TABLE IF NOT EXISTS `account_summary` (
+    `role` ENUM('admin', 'user') NOT NULL,
+    `total` int(11) NOT NULL DEFAULT 0,
+    PRIMARY KEY (`role`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8;
+
+-- Audit trail for admin mutations (written in batches by admin-service)
+CREATE TABLE IF NOT EXISTS `audit_log` (
+    `id` bigint NOT NULL AUTO_INCREMENT,
+    `created_at` datetime(6) NOT NULL,
+    `actor` varchar(50) DEFAULT NULL,
+    `action` varchar(50) NOT NULL,
+    `target_id` int(11) DEFAULT NULL,
+    `details` json DEFAULT NULL,
+    PRIMARY KEY (`id`),
+    KEY `idx_audit_log_target` (`target_id`, `created_at`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8;
+
+-- Outbox of account changes, written in the same transaction as the change
+-- and read incrementally by seq (admin-service /api/events)
+CREATE TABLE IF NOT EXISTS `account_events` (
+    `seq` bigint NOT NULL AUTO_INCREMENT,
+    `created_at` datetime(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+    `event_type` varchar(30) NOT NULL,
+    `account_id` int(11) NOT NULL,
+    `payload` json DEFAULT NULL,
+    PRIMARY KEY (`seq`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8;
+
 -- Insert default admin user
 INSERT INTO `accounts` (`username`, `password`, `email`, `role`) 
 VALUES ('admin', SHA1('myVerysecurepass531.'), 'admin@example.com', 'admin');
+
+-- Seed the summary from the initial accounts
+INSERT INTO `account_summary` (`role`, `total`) VALUES ('admin', 0), ('user', 0);
+UPDATE `account_summary` s
+SET s.`total` = (
+    SELECT COUNT(*) FROM `accounts` a WHERE a.`role` = s.`role` AND a.`deleted_at` IS NULL
+);
@@ -0,0 +1,118 @@
+-- Brings a database created from an older init.sql up to the current schema.
+-- init.sql only runs on an empty data volume; run this on existing ones:
+--   docker compose exec -T db mysql -uroot -pexample < shared/database/upgrade.sql
+-- Safe to run more than once: every step checks whether it is already applied.
+USE `pythonlogin`;
+
+DROP PROCEDURE IF EXISTS `add_column_if_missing`;
+DROP PROCEDURE IF EXISTS `add_index_if_missing`;
+DROP PROCEDURE IF EXISTS `drop_column_if_present`;
+
+DELIMITER //
+
+CREATE PROCEDURE `add_column_if_missing`(
+    IN table_name_in varchar(64), IN column_name_in varchar(64), IN definition text
+)
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE()
+          AND TABLE_NAME = table_name_in
+          AND COLUMN_NAME = column_name_in
+    ) THEN
+        SET @ddl = CONCAT('ALTER TABLE `', table_name_in, '` ADD COLUMN `', column_name_in, '` ', definition);
+        PREPARE stmt FROM @ddl;
+        EXECUTE stmt;
+        DEALLOCATE PREPARE stmt;
+    END IF;
+END //
+
+CREATE PROCEDURE `add_index_if_missing`(
+    IN table_name_in varchar(64), IN index_name_in varchar(64), IN columns_in text
+)
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE()
+          AND TABLE_NAME = table_name_in
+          AND INDEX_NAME = index_name_in
+    ) THEN
+        SET @ddl = CONCAT('ALTER TABLE `', table_name_in, '` ADD KEY `', index_name_in, '` (', columns_in, ')');
+        PREPARE stmt FROM @ddl;
+        EXECUTE stmt;
+        DEALLOCATE PREPARE stmt;
+    END IF;
+END //
+
+CREATE PROCEDURE `drop_column_if_present`(
+    IN table_name_in varchar(64), IN column_name_in varchar(64)
+)
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE()
+          AND TABLE_NAME = table_name_in
+          AND COLUMN_NAME = column_name_in
+    ) THEN
+        SET @ddl = CONCAT('ALTER TABLE `', table_name_in, '` DROP COLUMN `', column_name_in, '`');
+        PREPARE stmt FROM @ddl;
+        EXECUTE stmt;
+        DEALLOCATE PREPARE stmt;
+    END IF;
+END //
+
+DELIMITER ;
+
+-- accounts: columns added after the first release
+CALL add_column_if_missing('accounts', 'version', 'int(11) NOT NULL DEFAULT 1');
+CALL add_column_if_missing('accounts', 'email_domain', 'varchar(100) AS (SUBSTRING_INDEX(`email`, ''@'', -1)) STORED');
+CALL add_column_if_missing('accounts', 'deleted_at', 'datetime DEFAULT NULL');
+CALL add_column_if_missing('accounts', 'last_login', 'datetime DEFAULT NULL');
+CALL add_column_if_missing('accounts', 'login_count', 'int(11) NOT NULL DEFAULT 0');
+
+CALL add_index_if_missing('accounts', 'idx_accounts_username', '`username`');
+CALL add_index_if_missing('accounts', 'idx_accounts_email', '`email`');
+CALL add_index_if_missing('accounts', 'idx_accounts_email_domain', '`email_domain`');
+CALL add_index_if_missing('accounts', 'idx_accounts_deleted_at', '`deleted_at`');
+CALL add_index_if_missing('accounts', 'idx_accounts_last_login', '`last_login`');
+
+-- Replaced by email_domain, which also matches partial domains (its index goes with it)
+CALL drop_column_if_present('accounts', 'email_reversed');
+
+DROP PROCEDURE `add_column_if_missing`;
+DROP PROCEDURE `add_index_if_missing`;
+DROP PROCEDURE `drop_column_if_present`;
+
+-- Tables added after the first release (same definitions as init.sql)
+CREATE TABLE IF NOT EXISTS `account_summary` (
+    `role` ENUM('admin', 'user') NOT NULL,
+    `total` int(11) NOT NULL DEFAULT 0,
+    PRIMARY KEY (`role`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8;
+
+CREATE TABLE IF NOT EXISTS `audit_log` (
+    `id` bigint NOT NULL AUTO_INCREMENT,
+    `created_at` datetime(6) NOT NULL,
+    `actor` varchar(50) DEFAULT NULL,
+    `action` varchar(50) NOT NULL,
+    `target_id` int(11) DEFAULT NULL,
+    `details` json DEFAULT NULL,
+    PRIMARY KEY (`id`),
+    KEY `idx_audit_log_target` (`target_id`, `created_at`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8;
+
+CREATE TABLE IF NOT EXISTS `account_events` (
+    `seq` bigint NOT NULL AUTO_INCREMENT,
+    `created_at` datetime(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+    `event_type` varchar(30) NOT NULL,
+    `account_id` int(11) NOT NULL,
+    `payload` json DEFAULT NULL,
+    PRIMARY KEY (`seq`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8;
+
+-- Recount the summary from the live accounts
+INSERT IGNORE INTO `account_summary` (`role`, `total`) VALUES ('admin', 0), ('user', 0);
+UPDATE `account_summary` s
+SET s.`total` = (
+    SELECT COUNT(*) FROM `accounts` a WHERE a.`role` = s.`role` AND a.`deleted_at` IS NULL
+);
@@ -0,0 +1,166 @@
+"""Database access guarded by a circuit breaker.
+
+``Database`` hands out cursors whose calls are timed and reported to the
+breaker, so a slow or unreachable MySQL server makes requests fail fast
+with ``CircuitOpenError`` instead of piling up behind driver timeouts.
+Each statement is also traced as a span (see ``shared.tracing``).
+"""
+import os
+
+import MySQLdb
+import MySQLdb.cursors
+
+from shared import tracing
+from shared.circuit_breaker import CircuitBreaker
+
+
+# Client errors for a server that cannot be reached or went away:
+# CR_CONNECTION_ERROR, CR_CONN_HOST_ERROR, CR_SERVER_GONE_ERROR,
+# CR_SERVER_LOST and CR_SERVER_LOST_EXTENDED
+CONNECTION_ERRORS = frozenset({2002, 2003, 2006, 2013, 2055})
+
+
+def is_connection_error(exc):
+    """True when ``exc`` means MySQL is unreachable rather than that it said no.
+
+    Deadlocks (1213), lock wait timeouts (1205) or a bad column (1054) are
+    also ``OperationalError``, but the server answered them.
+    """
+    if isinstance(exc, MySQLdb.InterfaceError):
+        return True
+    return bool(exc.args) and exc.args[0] in CONNECTION_ERRORS
+
+
+def breaker_from_env(name="database"):
+    return CircuitBreaker(
+        name=name,
+        failure_rate=float(os.getenv("DB_BREAKER_FAILURE_RATE", "0.5")),
+        slow_call_seconds=float(os.getenv("DB_BREAKER_SLOW_CALL_SECONDS", "2")),
+        window=int(os.getenv("DB_BREAKER_WINDOW", "20")),
+        min_calls=int(os.getenv("DB_BREAKER_MIN_CALLS", "5")),
+        open_seconds=float(os.getenv("DB_BREAKER_OPEN_SECONDS", "10")),
+        # Only connection-level errors say anything about the server's health
+        failure_exceptions=(MySQLdb.OperationalError, MySQLdb.InterfaceError),
+        is_failure=is_connection_error,
+    )
+
+
+def configure_timeouts(app):
+    """Set driver timeouts (seconds) from the environment on a Flask-MySQLdb app."""
+    app.config["MYSQL_CONNECT_TIMEOUT"] = int(os.getenv("MYSQL_CONNECT_TIMEOUT", "5"))
+    app.config["MYSQL_CUSTOM_OPTIONS"] = {
+        "read_timeout": int(os.getenv("MYSQL_READ_TIMEOUT", "10")),
+        "write_timeout": int(os.getenv("MYSQL_WRITE_TIMEOUT", "10")),
+    }
+
+
+def connection_settings(app):
+    """``MySQLdb.connect`` arguments matching a Flask-MySQLdb app's config.
+
+    For background threads and workers that run outside a request.
+    """
+    return {
+        "host": app.config["MYSQL_HOST"],
+        "user": app.config["MYSQL_USER"],
+        "password": app.config["MYSQL_PASSWORD"],
+        "database": app.config["MYSQL_DB"],
+        "connect_timeout": app.config["MYSQL_CONNECT_TIMEOUT"],
+        **app.config["MYSQL_CUSTOM_OPTIONS"],
+    }
+
+
+class GuardedCursor:
+    """Cursor proxy that runs every database round trip through the breaker.
+
+    Fetches from buffered cursors are local and are not counted; fetches from
+    unbuffered (server-side) cursors read from the socket and are.
+    """
+
+    def __init__(self, cursor, breaker, unbuffered=False):
+        self._cursor = cursor
+        self._breaker = breaker
+        self._unbuffered = unbuffered
+
+    def _call(self, method, *args):
+        with self._breaker.call():
+            return method(*args)
+
+    def _traced(self, name, query, method, *args):
+        # Statement text only: parameters may hold passwords
+        attributes = {"db.system": "mysql", "db.statement": query}
+        with tracing.span(name, "client", attributes):
+            return self._call(method, *args)
+
+    def _fetch(self, method, *args):
+        if self._unbuffered:
+            with tracing.span("FETCH", "client", {"db.system": "mysql"}):
+                return self._call(method, *args)
+        return method(*args)
+
+    def execute(self, query, args=None):
+        name = query.split(None, 1)[0].upper()
+        if args is None:
+            return self._traced(name, query, self._cursor.execute, query)
+        return self._traced(name, query, self._cursor.execute, query, args)
+
+    def executemany(self, query, args):
+        name = query.split(None, 1)[0].upper()
+        return self._traced(name, query, self._cursor.executemany, query, args)
+
+    def fetchone(self):
+        return self._fetch(self._cursor.fetchone)
+
+    def fetchmany(self, size=None):
+        if size is None:
+            return self._fetch(self._cursor.fetchmany)
+        return self._fetch(self._cursor.fetchmany, size)
+
+    def fetchall(self):
+        return self._fetch(self._cursor.fetchall)
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class Database:
+    """Entry point for request-time queries.
+
+    ``connection`` is a callable returning the current connection (for
+    Flask-MySQLdb, ``lambda: mysql.connection``); connecting is also guarded.
+    """
+
+    def __init__(self, connection, breaker):
+        self._connection = connection
+        self.breaker = breaker
+
+    @property
+    def connection(self):
+        # The connection is reused within a request, so only failures to
+        # connect are reported; counting every lookup would dilute the window
+        self.breaker.before_call(probe=False)
+        try:
+            return self._connection()
+        except Exception as exc:
+            if self.breaker.counts_as_failure(exc):
+                self.breaker.record(0, failed=True)
+            raise
+
+    def cursor(self, cursorclass=MySQLdb.cursors.DictCursor):
+        connection = self.connection
+        unbuffered = issubclass(cursorclass, MySQLdb.cursors.CursorUseResultMixIn)
+        return GuardedCursor(connection.cursor(cursorclass), self.breaker, unbuffered)
+
+    def commit(self):
+        connection = self.connection
+        with tracing.span("COMMIT", "client", {"db.system": "mysql"}):
+            with self.breaker.call():
+                connection.commit()
+
+    def rollback(self):
+        connection = self.connection
+        with tracing.span("ROLLBACK", "client", {"db.system": "mysql"}):
+            with self.breaker.call():
+                connection.rollback()
@@ -0,0 +1,28 @@
+"""Request-scoped identity map.
+
+Rows loaded during a request are registered here by primary key, so later
+lookups of the same row in that request are served without another query.
+"""
+from flask import g
+
+
+class IdentityMap:
+    def __init__(self):
+        self._rows = {}
+
+    def get(self, table, key):
+        return self._rows.get((table, key))
+
+    def add(self, table, key, row):
+        self._rows[(table, key)] = row
+        return row
+
+    def discard(self, table, key):
+        self._rows.pop((table, key), None)
+
+
+def current():
+    """Return the identity map for the active request, creating it on first use."""
+    if "identity_map" not in g:
+        g.identity_map = IdentityMap()
+    return g.identity_map
@@ -0,0 +1,68 @@
+"""Account change feed (transactional outbox in ``account_events``).
+
+Every write to ``accounts`` records an event with the same cursor, as the
+last statement before the commit, so an event exists exactly when its change
+does. Consumers read events after the last sequence number they saw instead
+of rescanning ``accounts``.
+
+Sequence numbers are AUTO_INCREMENT values taken at insert time, so a
+transaction may commit after one holding a higher number. Reads therefore
+stop at the first missing number: a consumer that resumes from the last
+number it saw picks up the slower commit once it lands. A gap only counts as
+a rollback (and is skipped) once the event after it is ``gap_timeout``
+seconds old.
+"""
+import json
+
+CREATED = "account.created"
+UPDATED = "account.updated"
+DELETED = "account.deleted"
+
+DEFAULT_LIMIT = 100
+MAX_BATCH = 500
+DEFAULT_GAP_TIMEOUT = 5.0
+
+
+def record(cursor, event_type, account_id, data=None):
+    cursor.execute(
+        "INSERT INTO account_events (event_type, account_id, payload) VALUES (%s, %s, %s)",
+        (event_type, account_id, json.dumps(data or {}, default=str)),
+    )
+
+
+def clamp_limit(value):
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_LIMIT
+    return max(1, min(limit, MAX_BATCH))
+
+
+def read_since(cursor, after_seq, limit=DEFAULT_LIMIT, gap_timeout=DEFAULT_GAP_TIMEOUT):
+    """Events with ``seq > after_seq``, oldest first, up to the first open gap."""
+    cursor.execute(
+        "SELECT seq, event_type, account_id, payload, created_at, "
+        "created_at <= NOW(6) - INTERVAL %s MICROSECOND AS settled "
+        "FROM account_events WHERE seq > %s ORDER BY seq LIMIT %s",
+        (int(gap_timeout * 1_000_000), after_seq, clamp_limit(limit)),
+    )
+    events = []
+    expected = after_seq + 1
+    for row in cursor.fetchall():
+        # A missing number inserted before this row may still commit
+        if row["seq"] != expected and not row["settled"]:
+            break
+        events.append(to_json(row))
+        expected = row["seq"] + 1
+    return events
+
+
+def to_json(row):
+    payload = row["payload"]
+    return {
+        "seq": row["seq"],
+        "type": row["event_type"],
+        "account_id": row["account_id"],
+        "data": json.loads(payload) if isinstance(payload, (str, bytes)) else payload,
+        "created_at": row["created_at"].isoformat() if row["created_at"] else None,
+    }
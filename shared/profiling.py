@@ -0,0 +1,131 @@
+"""Opt-in per-request profiling.
+
+A request runs under cProfile when it carries ``X-Profile-Token`` equal to
+``PROFILE_TOKEN`` or is picked by ``PROFILE_SAMPLE_RATE``; both are off by
+default. Each profile is saved as ``.pstats`` in ``PROFILE_DIR`` (shared by
+the services in compose) and can be listed and downloaded from the admin
+service, or opened with ``python -m pstats`` / snakeviz.
+"""
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import random
+import re
+import time
+from datetime import datetime, timezone
+
+PROFILE_HEADER = "X-Profile-Token"
+SUFFIX = ".pstats"
+NAME_RE = re.compile(r"[A-Za-z0-9_.-]+\.pstats")
+
+
+class RequestProfiler:
+    def __init__(self, service_name, directory, token=None, sample_rate=0.0, keep=100):
+        self.service_name = service_name
+        self.directory = directory
+        self.token = token
+        self.sample_rate = sample_rate
+        self.keep = keep
+
+    @classmethod
+    def from_env(cls, service_name, default_directory):
+        return cls(
+            service_name,
+            os.getenv("PROFILE_DIR", default_directory),
+            token=os.getenv("PROFILE_TOKEN") or None,
+            sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+            keep=int(os.getenv("PROFILE_KEEP", "100")),
+        )
+
+    @property
+    def enabled(self):
+        return self.token is not None or self.sample_rate > 0
+
+    def wants(self, headers):
+        """Whether a request with these headers should be profiled."""
+        supplied = headers.get(PROFILE_HEADER)
+        if supplied and self.token is not None:
+            return hmac.compare_digest(supplied.encode(), self.token.encode())
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def save(self, profiler, method, endpoint, elapsed):
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+        label = re.sub(r"[^A-Za-z0-9_]+", "_", endpoint or "unknown").strip("_")
+        name = f"{self.service_name}__{stamp}__{method}__{label}__{round(elapsed * 1000)}ms{SUFFIX}"
+        os.makedirs(self.directory, exist_ok=True)
+        profiler.dump_stats(os.path.join(self.directory, name))
+        self.prune()
+        return name
+
+    def prune(self):
+        # Keep the newest ``keep`` profiles of this service
+        mine = [p for p in self.list() if p["service"] == self.service_name]
+        for profile in mine[self.keep:]:
+            try:
+                os.remove(os.path.join(self.directory, profile["name"]))
+            except OSError:
+                pass
+
+    def list(self):
+        """Saved profiles of every service, newest first."""
+        try:
+            entries = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return []
+        profiles = []
+        for entry in entries:
+            if not NAME_RE.fullmatch(entry.name) or not entry.is_file():
+                continue
+            stat = entry.stat()
+            profiles.append({
+                "name": entry.name,
+                "service": entry.name.split("__", 1)[0],
+                "size": stat.st_size,
+                "created": stat.st_mtime,
+            })
+        profiles.sort(key=lambda p: p["created"], reverse=True)
+        return profiles
+
+    def path(self, name):
+        """Absolute path of a saved profile, or None for unknown/unsafe names."""
+        if not NAME_RE.fullmatch(name) or name.startswith("."):
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.isfile(path) else None
+
+    def install(self, app):
+        from flask import g, request
+
+        @app.before_request
+        def _profile_request_started():
+            if not self.enabled or not self.wants(request.headers):
+                return
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another request on a different thread is being profiled
+                return
+            g.request_profiler = (profiler, time.perf_counter())
+
+        @app.teardown_request
+        def _profile_request_finished(exc):
+            started = g.pop("request_profiler", None)
+            if started is None:
+                return
+            profiler, start = started
+            profiler.disable()
+            try:
+                self.save(profiler, request.method, request.endpoint, time.perf_counter() - start)
+            except OSError as e:
+                print(f"Error saving request profile: {str(e)}")  # Log the error
+
+
+def text_report(path, limit=40):
+    """Top functions by cumulative time, as printed by ``pstats``."""
+    out = io.StringIO()
+    stats = pstats.Stats(path, stream=out)
+    stats.sort_stats("cumulative").print_stats(limit)
+    return out.getvalue()
@@ -0,0 +1,119 @@
+"""Startup profiling.
+
+With ``STARTUP_PROFILE=1`` a service records how long each startup phase
+took (imports, config load, DB init, ...) plus the first request, and
+prints a summary once that first request has been served.
+
+Import cost per package can be measured separately with::
+
+    python -m shared.startup admin-service
+"""
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+
+def process_age():
+    """Seconds since this process was started, or None if unknown (non-Linux)."""
+    try:
+        with open("/proc/self/stat") as f:
+            # Fields after the command name, which may contain spaces
+            fields = f.read().rpartition(")")[2].split()
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupProfiler:
+    def __init__(self, enabled=None):
+        if enabled is None:
+            enabled = os.getenv("STARTUP_PROFILE", "").lower() in ("1", "true", "yes")
+        self.enabled = enabled
+        self.phases = []
+        self._last = time.perf_counter()
+        if enabled:
+            # Everything before the profiler existed: interpreter start and imports
+            age = process_age()
+            if age is not None:
+                self.phases.append(("imports", age))
+
+    def mark(self, name):
+        """Record the time since the previous mark as phase ``name``."""
+        now = time.perf_counter()
+        if self.enabled:
+            self.phases.append((name, now - self._last))
+        self._last = now
+
+    def install(self, app):
+        """Time the first request and print the report after it."""
+        if not self.enabled:
+            return
+        state = {}
+
+        @app.before_request
+        def _startup_first_request_started():
+            if "done" not in state:
+                self.mark("idle_until_first_request")
+                state.setdefault("start", time.perf_counter())
+
+        @app.after_request
+        def _startup_first_request_finished(response):
+            if "done" not in state and "start" in state:
+                state["done"] = True
+                self.mark("first_request")
+                print(self.report())
+            return response
+
+    def report(self):
+        lines = ["Startup profile (ms):"]
+        for name, seconds in self.phases:
+            lines.append(f"  {name:<28}{seconds * 1000:10.1f}")
+        total = sum(s for n, s in self.phases if n != "idle_until_first_request")
+        lines.append(f"  {'total (excluding idle)':<28}{total * 1000:10.1f}")
+        return "\n".join(lines)
+
+
+def summarize_importtime(output, top=20):
+    """Aggregate ``python -X importtime`` output by top-level package.
+
+    Returns ``[(package, self_us, modules)]`` sorted by total self time.
+    """
+    totals = defaultdict(lambda: [0, 0])
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _cumulative, name = line[len("import time:"):].split("|", 2)
+        package = name.strip().split(".")[0]
+        totals[package][0] += int(self_us)
+        totals[package][1] += 1
+    ranked = sorted(totals.items(), key=lambda item: item[1][0], reverse=True)
+    return [(package, us, count) for package, (us, count) in ranked[:top]]
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        print("Usage: python -m shared.startup <service-dir> [top]", file=sys.stderr)
+        return 2
+    service_dir = argv[0]
+    top = int(argv[1]) if len(argv) > 1 else 20
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=service_dir,
+        capture_output=True,
+        text=True,
+    )
+    rows = summarize_importtime(result.stderr, top)
+    print(f"{'package':<30}{'self ms':>10}{'modules':>10}")
+    for package, us, count in rows:
+        print(f"{package:<30}{us / 1000:10.1f}{count:10d}")
+    print(f"{'total':<30}{sum(r[1] for r in rows) / 1000:10.1f}")
+    return result.returncode
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+"""Incrementally maintained per-role account counts (``account_summary`` table).
+
+Every write path that changes the set of accounts or their roles adjusts the
+summary in the same transaction, so reading the counts is a two-row lookup
+instead of a scan of ``accounts``. Each summary row is a hot spot shared by all
+writers, so callers adjust it at the end of the transaction, followed only by
+the (uncontended) outbox insert, which keeps its lock held as briefly as
+possible.
+"""
+from shared import accounts
+from shared.validation import ROLES
+
+SELECT_SUMMARY = "SELECT role, total FROM account_summary"
+
+
+def account_added(cursor, role):
+    cursor.execute(
+        "INSERT INTO account_summary (role, total) VALUES (%s, 1) "
+        "ON DUPLICATE KEY UPDATE total = total + 1",
+        (role,),
+    )
+
+
+def account_removed(cursor, account_id):
+    """Decrement the role of an account this transaction has just soft-deleted.
+
+    Only call it when the delete affected the row: the transaction then holds
+    the row's lock, so it cannot change or be purged before the commit.
+    """
+    cursor.execute(
+        "UPDATE account_summary s JOIN accounts a ON a.role = s.role "
+        "SET s.total = s.total - 1 WHERE a.id = %s",
+        (account_id,),
+    )
+
+
+def role_changed(cursor, old_role, new_role):
+    """Move one account between roles; a no-op when the role is unchanged."""
+    if old_role == new_role:
+        return
+    cursor.execute(
+        "UPDATE account_summary SET total = total + IF(role = %s, 1, -1) "
+        "WHERE role IN (%s, %s)",
+        (new_role, old_role, new_role),
+    )
+
+
+def rebuild(cursor):
+    """Recompute the summary from ``accounts`` (full scan) and return the counts."""
+    counts = dict.fromkeys(sorted(ROLES), 0)
+    counts.update(accounts.count_by_role(cursor))
+    cursor.executemany(
+        "INSERT INTO account_summary (role, total) VALUES (%s, %s) "
+        "ON DUPLICATE KEY UPDATE total = VALUES(total)",
+        list(counts.items()),
+    )
+    return counts
+
+
+def read(cursor):
+    cursor.execute(SELECT_SUMMARY)
+    return {row["role"]: row["total"] for row in cursor.fetchall()}
@@ -0,0 +1,44 @@
+"""Jinja environment tuning shared by both services."""
+import os
+import tempfile
+
+
+def enable_bytecode_cache(app, directory=None):
+    """Persist compiled templates on disk so restarts skip Jinja compilation.
+
+    Must be called before the app's Jinja environment is first used. The
+    directory defaults to ``$JINJA_CACHE_DIR`` or a per-service folder in the
+    system temp dir.
+    """
+    # Imported here so the shared helpers and their tests need no Jinja install
+    from jinja2 import FileSystemBytecodeCache
+
+    if directory is None:
+        directory = os.getenv("JINJA_CACHE_DIR") or os.path.join(
+            tempfile.gettempdir(), "jinja-" + os.path.basename(app.root_path)
+        )
+    os.makedirs(directory, exist_ok=True)
+    app.jinja_options = {
+        **app.jinja_options,
+        "bytecode_cache": FileSystemBytecodeCache(directory),
+    }
+    return directory
+
+
+def buffered(chunks, size=8192):
+    """Coalesce a template stream into chunks of roughly ``size`` characters.
+
+    Jinja yields one small string per template statement; batching them keeps
+    streamed responses from turning into thousands of tiny socket writes.
+    """
+    pending = []
+    length = 0
+    for chunk in chunks:
+        pending.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield "".join(pending)
+            pending = []
+            length = 0
+    if pending:
+        yield "".join(pending)
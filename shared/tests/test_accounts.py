@@ -0,0 +1,101 @@
+from unittest.mock import MagicMock
+
+from shared import accounts
+
+
+def test_reads_skip_soft_deleted_rows():
+    cursor = MagicMock()
+
+    accounts.get(cursor, 1)
+    accounts.authenticate(cursor, "alice", "hash")
+    accounts.username_taken(cursor, "alice")
+    accounts.email_taken(cursor, "alice@example.com")
+    accounts.select_all(cursor)
+    accounts.recent(cursor, 10)
+    accounts.with_identity(cursor, 1, "alice", "alice@example.com")
+    accounts.count(cursor)
+    accounts.count_by_role(cursor)
+    accounts.select_for_export(cursor)
+    accounts.search(cursor, "al", 5)
+    accounts.search(cursor, "@example.com", 5)
+
+    for call in cursor.execute.call_args_list:
+        assert accounts.LIVE in call.args[0]
+
+
+def test_soft_delete_stamps_the_row():
+    cursor = MagicMock()
+
+    accounts.soft_delete(cursor, 7)
+
+    sql, params = cursor.execute.call_args.args
+    assert sql.startswith("UPDATE accounts SET deleted_at")
+    assert params == (7,)
+
+
+def test_hash_password_matches_mysql_sha1():
+    assert accounts.hash_password("secret") == "e5e9fa1ba31ecd1ae84f75caaa474f3a663f05f4"
+
+
+class FakeConnection:
+    def __init__(self, batches):
+        self.batches = list(batches)
+        self.commits = 0
+        self.closed = False
+
+    def cursor(self):
+        cursor = MagicMock()
+        cursor.rowcount = self.batches.pop(0)
+        return cursor
+
+    def commit(self):
+        self.commits += 1
+
+    def close(self):
+        self.closed = True
+
+
+def test_purger_deletes_in_batches_until_short_batch():
+    conn = FakeConnection([2, 2, 1])
+    purger = accounts.Purger(lambda: conn, batch_size=2, pause=0)
+
+    assert purger.purge_once() == 5
+    assert conn.commits == 3
+    assert conn.closed
+    assert purger.purged == 5
+
+
+def test_purger_stops_between_batches():
+    conn = FakeConnection([2, 2, 2])
+    purger = accounts.Purger(lambda: conn, batch_size=2, pause=0)
+    purger.stop()
+
+    assert purger.purge_once() == 2
+
+
+def test_update_is_compare_and_swap():
+    cursor = MagicMock()
+    cursor.rowcount = 0
+
+    assert accounts.update(cursor, 7, 3, "alice", "alice@example.com", "user") is False
+
+    sql, params = cursor.execute.call_args.args
+    assert "WHERE id = %s AND version = %s" in sql
+    assert params[-2:] == (7, 3)
+
+
+def test_search_escapes_wildcards():
+    cursor = MagicMock()
+    accounts.search(cursor, "a_b%", 5)
+
+    params = cursor.execute.call_args.args[1]
+    assert params[0] == "a\\_b\\%%"
+
+
+def test_domain_search_matches_partial_domains():
+    cursor = MagicMock()
+    accounts.search(cursor, "@exa", 5)
+
+    sql, params = cursor.execute.call_args.args
+    assert "email_domain LIKE" in sql
+    assert params == ("exa%", 5)
@@ -0,0 +1,89 @@
+from datetime import datetime
+from unittest.mock import MagicMock
+
+from shared.activity import LoginActivity, update_statement
+
+T1 = datetime(2026, 1, 1, 10, 0)
+T2 = datetime(2026, 1, 1, 10, 5)
+
+
+def test_logins_are_coalesced_per_account():
+    conn = MagicMock()
+    activity = LoginActivity(lambda: conn)
+    activity._ensure_worker = lambda: None
+
+    activity.record(1, T1)
+    activity.record(1, T2)
+    activity.record(2, T1)
+
+    assert activity.flush() == 2
+    cursor = conn.cursor.return_value
+    cursor.execute.assert_called_once()
+    sql, params = cursor.execute.call_args.args
+    assert sql.count("WHEN %s THEN %s") == 4
+    assert params == (1, T2, 2, T1, 1, 2, 2, 1, 1, 2)
+    conn.commit.assert_called_once()
+    assert activity.flush() == 0
+
+
+def test_batches_split_into_several_statements():
+    conn = MagicMock()
+    activity = LoginActivity(lambda: conn, batch_size=2)
+    activity._ensure_worker = lambda: None
+
+    for account_id in range(5):
+        activity.record(account_id, T1)
+    activity.flush()
+
+    assert conn.cursor.return_value.execute.call_count == 3
+
+
+def test_failed_flush_is_retried():
+    conn = MagicMock()
+    conn.cursor.return_value.execute.side_effect = [Exception("gone away"), None]
+    activity = LoginActivity(lambda: conn)
+    activity._ensure_worker = lambda: None
+
+    activity.record(1, T1)
+    assert activity.flush() == 0
+    activity.record(1, T2)
+    assert activity.flush() == 1
+
+    params = conn.cursor.return_value.execute.call_args.args[1]
+    assert params == (1, T2, 1, 2, 1)
+    assert activity.failed == 1
+
+
+def test_overlay_adds_unflushed_logins():
+    activity = LoginActivity(MagicMock())
+    activity._ensure_worker = lambda: None
+    account = {"id": 1, "last_login": T1, "login_count": 3}
+
+    assert activity.overlay(account) is account
+    activity.record(1, T2)
+
+    assert activity.overlay(account) == {"id": 1, "last_login": T2, "login_count": 4}
+    assert activity.overlay(None) is None
+
+
+def test_update_statement_keeps_latest_login():
+    sql, _ = update_statement([(1, (T1, 1))])
+
+    assert "GREATEST" in sql
+    assert sql.endswith("WHERE id IN (%s)")
+
+
+def test_overlay_counts_activity_until_flush_is_reported():
+    seen = []
+    conn = MagicMock()
+    activity = LoginActivity(lambda: conn, on_flush=lambda ids: seen.append(ids))
+    activity._ensure_worker = lambda: None
+    account = {"id": 1, "last_login": None, "login_count": 4}
+
+    activity.record(1, T1)
+    # While the UPDATE is being committed the activity is still overlaid
+    conn.commit.side_effect = lambda: seen.append(activity.overlay(account)["login_count"])
+    activity.flush()
+
+    assert seen == [5, [1]]
+    assert activity.overlay(account) is account
@@ -0,0 +1,100 @@
+import threading
+import time
+
+from shared import admission
+from shared.admission import AdmissionController, AdmissionMiddleware
+
+
+def wsgi_app(environ, start_response):
+    start_response("200 OK", [("Content-Type", "text/plain")])
+    return [b"ok"]
+
+
+def call(middleware, path):
+    captured = {}
+
+    def start_response(status, headers):
+        captured["status"] = status
+        captured["headers"] = dict(headers)
+
+    result = middleware({"PATH_INFO": path}, start_response)
+    body = b"".join(result)
+    return captured, body, result
+
+
+def test_admits_up_to_limit_then_sheds_after_deadline():
+    controller = AdmissionController(limit=1, deadlines={0: 0.01, 1: 0.01, 2: 0.01})
+
+    assert controller.acquire(admission.NORMAL) is None
+    assert controller.acquire(admission.NORMAL) == admission.DEADLINE
+    controller.release()
+    assert controller.acquire(admission.NORMAL) is None
+
+    assert controller.admitted[admission.NORMAL] == 2
+    assert controller.shed[admission.NORMAL, admission.DEADLINE] == 1
+
+
+def test_full_queue_is_shed_immediately():
+    controller = AdmissionController(limit=1, max_queue=0)
+
+    controller.acquire(admission.HIGH)
+
+    assert controller.acquire(admission.HIGH) == admission.QUEUE_FULL
+
+
+def test_released_slot_goes_to_highest_priority_waiter():
+    controller = AdmissionController(limit=1, deadlines={0: 5, 1: 5, 2: 5})
+    controller.acquire(admission.NORMAL)
+    order = []
+
+    def wait(priority):
+        controller.acquire(priority)
+        order.append(priority)
+        controller.release()
+
+    threads = [threading.Thread(target=wait, args=(p,)) for p in (admission.LOW, admission.HIGH)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.05)  # Both are queued before the slot frees up
+    controller.release()
+    for thread in threads:
+        thread.join(1)
+
+    assert order == [admission.HIGH, admission.LOW]
+    assert controller.active == 0
+
+
+def test_middleware_returns_503_with_retry_after():
+    controller = AdmissionController(limit=1, max_queue=0)
+    middleware = AdmissionMiddleware(wsgi_app, controller, lambda path: admission.NORMAL)
+
+    first, body, result = call(middleware, "/users")
+    second, _, _ = call(middleware, "/api/users/search")
+    result.close()
+    third, _, _ = call(middleware, "/users")
+
+    assert first["status"] == "200 OK" and body == b"ok"
+    assert second["status"].startswith("503")
+    assert second["headers"]["Content-Type"] == "application/json"
+    assert int(second["headers"]["Retry-After"]) >= 1
+    assert third["status"] == "200 OK"
+
+
+def test_bypassed_paths_ignore_the_limit():
+    controller = AdmissionController(limit=1, max_queue=0)
+    controller.acquire(admission.NORMAL)
+    middleware = AdmissionMiddleware(wsgi_app, controller, lambda path: None)
+
+    captured, _, _ = call(middleware, "/healthz")
+
+    assert captured["status"] == "200 OK"
+
+
+def test_metrics_export_shed_counts():
+    controller = AdmissionController(limit=0, max_queue=0)
+    controller.acquire(admission.LOW)
+
+    text = controller.metrics()
+
+    assert 'admission_shed_total{priority="low",reason="queue_full"} 1' in text
+    assert "admission_in_flight 0" in text
@@ -0,0 +1,53 @@
+import json
+
+from shared.audit import BLOCK, AuditLog, FileAuditSink
+
+
+class ListSink:
+    def __init__(self):
+        self.batches = []
+
+    def write(self, events):
+        self.batches.append(list(events))
+
+
+def test_events_are_flushed_in_batches_on_close():
+    sink = ListSink()
+    audit = AuditLog(sink, batch_size=2, flush_interval=10)
+    for i in range(5):
+        assert audit.record("admin", "user.create", target_id=i)
+    audit.close()
+
+    events = [e for batch in sink.batches for e in batch]
+    assert [e["target_id"] for e in events] == [0, 1, 2, 3, 4]
+    assert all(len(batch) <= 2 for batch in sink.batches)
+
+
+def test_full_queue_drops_events():
+    audit = AuditLog(ListSink(), maxsize=1, flush_interval=10)
+    # No worker yet: fill the queue directly to keep the test deterministic
+    audit._worker = object()
+    assert audit.record("admin", "user.delete", 1)
+    assert not audit.record("admin", "user.delete", 2)
+    assert audit.dropped == 1
+
+
+def test_block_policy_gives_up_after_timeout():
+    audit = AuditLog(ListSink(), maxsize=1, policy=BLOCK, block_timeout=0.01)
+    audit._worker = object()
+    audit.record("admin", "user.update", 1)
+    assert not audit.record("admin", "user.update", 2)
+    assert audit.dropped == 1
+
+
+def test_file_sink_rotates(tmp_path):
+    path = tmp_path / "audit.log"
+    sink = FileAuditSink(str(path), max_bytes=50, backup_count=2)
+    event = {"time": "t", "actor": "admin", "action": "user.create", "target_id": 1, "details": {}}
+    sink.write([event])
+    sink.write([event])
+
+    assert (tmp_path / "audit.log.1").exists()
+    assert (tmp_path / "audit.log.2").exists()
+    line = (tmp_path / "audit.log.1").read_text().splitlines()[0]
+    assert json.loads(line)["action"] == "user.create"
@@ -0,0 +1,41 @@
+from shared.cache import LRUCache
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "a" is now the most recent entry
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_get_or_set_only_calls_factory_on_miss():
+    cache = LRUCache()
+    calls = []
+
+    def factory():
+        calls.append(1)
+        return "value"
+
+    assert cache.get_or_set("key", factory) == "value"
+    assert cache.get_or_set("key", factory) == "value"
+    assert len(calls) == 1
+    assert cache.hits == 1
+    assert cache.misses == 1
+
+
+def test_ttl_expires_entries(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("shared.cache.time.monotonic", lambda: now[0])
+    cache = LRUCache(ttl=10)
+    cache.set("key", "value")
+
+    now[0] = 105.0
+    assert cache.get("key") == "value"
+    now[0] = 111.0
+    assert cache.get("key") is None
+    assert cache.get("key", allow_stale=True) == "value"
@@ -0,0 +1,95 @@
+import pytest
+
+from shared import circuit_breaker
+from shared.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", clock)
+    return clock
+
+
+def fail(breaker):
+    with pytest.raises(ConnectionError):
+        with breaker.call():
+            raise ConnectionError("down")
+
+
+def test_opens_when_failure_rate_reached(clock):
+    breaker = CircuitBreaker(failure_rate=0.5, window=4, min_calls=4)
+    for _ in range(2):
+        with breaker.call():
+            pass
+    fail(breaker)
+    assert breaker.state == circuit_breaker.CLOSED
+    fail(breaker)
+
+    assert breaker.state == circuit_breaker.OPEN
+    with pytest.raises(CircuitOpenError) as excinfo:
+        breaker.before_call()
+    assert excinfo.value.retry_after == pytest.approx(10.0)
+
+
+def test_slow_calls_count_as_failures(clock):
+    breaker = CircuitBreaker(slow_call_seconds=1.0, min_calls=1, failure_rate=1.0)
+    breaker.record(2.5)
+
+    assert breaker.state == circuit_breaker.OPEN
+
+
+def test_ignored_exceptions_do_not_trip(clock):
+    breaker = CircuitBreaker(min_calls=1, failure_exceptions=(ConnectionError,))
+    with pytest.raises(ValueError):
+        with breaker.call():
+            raise ValueError("duplicate key")
+
+    assert breaker.state == circuit_breaker.CLOSED
+
+
+def test_failure_predicate_filters_matching_exceptions(clock):
+    breaker = CircuitBreaker(
+        min_calls=1, failure_exceptions=(OSError,), is_failure=lambda exc: exc.errno == 111
+    )
+    with pytest.raises(OSError):
+        with breaker.call():
+            raise OSError(13, "permission denied")
+    assert breaker.state == circuit_breaker.CLOSED
+
+    with pytest.raises(OSError):
+        with breaker.call():
+            raise OSError(111, "connection refused")
+    assert breaker.state == circuit_breaker.OPEN
+
+
+def test_half_open_probe_closes_on_success(clock):
+    breaker = CircuitBreaker(min_calls=1, open_seconds=5)
+    fail(breaker)
+    clock.now += 5
+
+    assert breaker.state == circuit_breaker.HALF_OPEN
+    breaker.before_call()
+    # Only one probe at a time
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record(0.01)
+
+    assert breaker.state == circuit_breaker.CLOSED
+
+
+def test_half_open_probe_failure_reopens(clock):
+    breaker = CircuitBreaker(min_calls=1, open_seconds=5)
+    fail(breaker)
+    clock.now += 5
+    fail(breaker)
+
+    assert breaker.state == circuit_breaker.OPEN
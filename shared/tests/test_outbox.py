@@ -0,0 +1,70 @@
+import json
+from datetime import datetime
+from unittest.mock import MagicMock
+
+from shared import outbox
+
+
+def test_record_serializes_payload():
+    cursor = MagicMock()
+
+    outbox.record(cursor, outbox.UPDATED, 3, {"role": "admin"})
+
+    sql, params = cursor.execute.call_args.args
+    assert sql.startswith("INSERT INTO account_events")
+    assert params == ("account.updated", 3, json.dumps({"role": "admin"}))
+
+
+def event_row(seq, settled=True):
+    return {
+        "seq": seq,
+        "event_type": "account.deleted",
+        "account_id": 3,
+        "payload": "{}",
+        "created_at": datetime(2026, 1, 1, 12, 0),
+        "settled": int(settled),
+    }
+
+
+def test_read_since_caps_batch():
+    cursor = MagicMock()
+    cursor.fetchall.return_value = [event_row(11)]
+
+    events = outbox.read_since(cursor, 10, limit=10_000, gap_timeout=0.5)
+
+    assert events == [
+        {
+            "seq": 11,
+            "type": "account.deleted",
+            "account_id": 3,
+            "data": {},
+            "created_at": "2026-01-01T12:00:00",
+        }
+    ]
+    assert cursor.execute.call_args.args[1] == (500_000, 10, outbox.MAX_BATCH)
+
+
+def test_read_since_stops_at_an_open_gap():
+    cursor = MagicMock()
+    # 12 is still uncommitted: 13 must wait for it instead of moving the consumer past it
+    cursor.fetchall.return_value = [event_row(11), event_row(13, settled=False), event_row(14)]
+
+    assert [event["seq"] for event in outbox.read_since(cursor, 10)] == [11]
+
+    # Nothing after 10 has committed yet
+    cursor.fetchall.return_value = [event_row(12, settled=False)]
+    assert outbox.read_since(cursor, 10) == []
+
+
+def test_read_since_skips_a_gap_older_than_the_timeout():
+    cursor = MagicMock()
+    # 12 was rolled back long enough ago
+    cursor.fetchall.return_value = [event_row(11), event_row(13), event_row(15, settled=False)]
+
+    assert [event["seq"] for event in outbox.read_since(cursor, 10)] == [11, 13]
+
+
+def test_clamp_limit():
+    assert outbox.clamp_limit(-1) == 1
+    assert outbox.clamp_limit("abc") == outbox.DEFAULT_LIMIT
+    assert outbox.clamp_limit(10_000) == outbox.MAX_BATCH
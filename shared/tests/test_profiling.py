@@ -0,0 +1,66 @@
+import cProfile
+import os
+
+from shared.profiling import RequestProfiler, text_report
+
+
+def make_profile():
+    profiler = cProfile.Profile()
+    profiler.enable()
+    sum(range(1000))
+    profiler.disable()
+    return profiler
+
+
+def test_disabled_by_default(tmp_path):
+    profiler = RequestProfiler("admin-service", str(tmp_path))
+
+    assert not profiler.enabled
+    assert not profiler.wants({"X-Profile-Token": "anything"})
+
+
+def test_token_must_match(tmp_path):
+    profiler = RequestProfiler("admin-service", str(tmp_path), token="s3cret")
+
+    assert profiler.wants({"X-Profile-Token": "s3cret"})
+    assert not profiler.wants({"X-Profile-Token": "guess"})
+    assert not profiler.wants({})
+
+
+def test_sample_rate(tmp_path):
+    profiler = RequestProfiler("admin-service", str(tmp_path), sample_rate=1.0)
+
+    assert profiler.wants({})
+
+
+def test_save_list_and_report(tmp_path):
+    profiler = RequestProfiler("user-service", str(tmp_path / "profiles"))
+
+    name = profiler.save(make_profile(), "GET", "profile", 0.0123)
+
+    [saved] = profiler.list()
+    assert saved["name"] == name
+    assert saved["service"] == "user-service"
+    assert name.endswith("__GET__profile__12ms.pstats")
+    assert "cumulative" in text_report(profiler.path(name))
+
+
+def test_keeps_newest_profiles_per_service(tmp_path):
+    profiler = RequestProfiler("admin-service", str(tmp_path), keep=2)
+    other = os.path.join(str(tmp_path), "user-service__x__GET__index__1ms.pstats")
+    open(other, "w").close()
+    os.utime(other, (0, 0))
+
+    for _ in range(3):
+        profiler.save(make_profile(), "GET", "users", 0.001)
+
+    services = [p["service"] for p in profiler.list()]
+    assert services.count("admin-service") == 2
+    assert services.count("user-service") == 1
+
+
+def test_path_rejects_unsafe_names(tmp_path):
+    profiler = RequestProfiler("admin-service", str(tmp_path))
+
+    assert profiler.path("../main.py") is None
+    assert profiler.path("missing.pstats") is None
@@ -0,0 +1,35 @@
+from shared.startup import StartupProfiler, summarize_importtime
+
+IMPORTTIME = """\
+import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _io
+import time:       300 |        800 |     flask.json
+import time:      1500 |       2300 |   flask
+import time:        40 |         40 | MySQLdb._exceptions
+import time:       200 |        240 | MySQLdb
+"""
+
+
+def test_summarize_importtime_groups_by_package():
+    rows = summarize_importtime(IMPORTTIME)
+
+    assert rows[0] == ("flask", 1800, 2)
+    assert ("MySQLdb", 240, 2) in rows
+    assert ("_io", 120, 1) in rows
+
+
+def test_disabled_profiler_records_nothing():
+    profiler = StartupProfiler(enabled=False)
+    profiler.mark("config")
+
+    assert profiler.phases == []
+
+
+def test_report_lists_phases():
+    profiler = StartupProfiler(enabled=True)
+    profiler.mark("config")
+    profiler.mark("db_init")
+
+    report = profiler.report()
+    assert "config" in report
+    assert "db_init" in report
@@ -0,0 +1,24 @@
+from unittest.mock import MagicMock
+
+from shared import summary
+
+
+def test_rebuild_fills_missing_roles_with_zero():
+    cursor = MagicMock()
+    cursor.fetchall.return_value = [{"role": "user", "total": 5}]
+
+    counts = summary.rebuild(cursor)
+
+    assert counts == {"admin": 0, "user": 5}
+    rows = cursor.executemany.call_args.args[1]
+    assert rows == [("admin", 0), ("user", 5)]
+
+
+def test_role_changed_is_a_single_statement():
+    cursor = MagicMock()
+
+    summary.role_changed(cursor, "user", "admin")
+    summary.role_changed(cursor, "admin", "admin")
+
+    cursor.execute.assert_called_once()
+    assert cursor.execute.call_args.args[1] == ("admin", "user", "admin")
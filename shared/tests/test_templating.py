@@ -0,0 +1,10 @@
+from shared.templating import buffered
+
+
+def test_buffered_coalesces_small_chunks():
+    chunks = list(buffered(["ab", "cd", "ef", "g"], size=4))
+    assert chunks == ["abcd", "efg"]
+
+
+def test_buffered_empty_stream():
+    assert list(buffered([], size=4)) == []
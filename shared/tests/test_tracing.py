@@ -0,0 +1,97 @@
+from shared import tracing
+
+
+class ListExporter:
+    def __init__(self):
+        self.batches = []
+
+    def export(self, spans):
+        self.batches.append([span.to_dict() for span in spans])
+
+
+def make_tracer(sample_rate=1.0):
+    exporter = ListExporter()
+    return tracing.Tracer("test-service", exporter, sample_rate), exporter
+
+
+def test_parse_traceparent():
+    value = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+
+    assert tracing.parse_traceparent(value) == (
+        "4bf92f3577b34da6a3ce929d0e0e4736",
+        "00f067aa0ba902b7",
+        True,
+    )
+    assert tracing.parse_traceparent("00-" + "0" * 32 + "-00f067aa0ba902b7-01") is None
+    assert tracing.parse_traceparent("garbage") is None
+    assert tracing.parse_traceparent(None) is None
+
+
+def test_children_are_exported_with_their_root():
+    tracer, exporter = make_tracer()
+
+    with tracer.start_span("GET /users", "server") as root:
+        with tracer.start_span("SELECT", "client") as child:
+            pass
+        assert exporter.batches == []
+
+    [batch] = exporter.batches
+    assert [span["name"] for span in batch] == ["SELECT", "GET /users"]
+    assert child.trace_id == root.trace_id
+    assert batch[0]["parentSpanId"] == root.span_id
+    assert batch[1]["parentSpanId"] == ""
+    assert batch[1]["resource"] == {"service.name": "test-service"}
+
+
+def test_remote_parent_keeps_trace_id():
+    tracer, exporter = make_tracer()
+    parent = tracing.parse_traceparent("00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01")
+
+    with tracer.start_span("GET /profile", "server", parent=parent) as request_span:
+        pass
+
+    assert request_span.traceparent.startswith("00-4bf92f3577b34da6a3ce929d0e0e4736-")
+    assert exporter.batches[0][0]["parentSpanId"] == "00f067aa0ba902b7"
+
+
+def test_unsampled_traces_are_not_exported():
+    tracer, exporter = make_tracer(sample_rate=0.0)
+
+    with tracer.start_span("GET /") as request_span:
+        with tracer.start_span("SELECT"):
+            pass
+
+    assert request_span.traceparent.endswith("-00")
+    assert exporter.batches == []
+
+
+def test_errors_are_recorded():
+    tracer, exporter = make_tracer()
+
+    try:
+        with tracer.start_span("SELECT"):
+            raise ValueError("boom")
+    except ValueError:
+        pass
+
+    assert exporter.batches[0][0]["status"] == {"code": "ERROR", "message": "ValueError: boom"}
+
+
+def test_span_is_noop_without_tracer():
+    tracing.set_tracer(None)
+
+    with tracing.span("password.hash") as span:
+        span.set_attribute("hash.algorithm", "sha1")
+
+    assert span is tracing.NOOP_SPAN
+
+
+def test_file_exporter_writes_json_lines(tmp_path):
+    path = tmp_path / "traces" / "spans.jsonl"
+    tracer = tracing.Tracer("test-service", tracing.FileExporter(str(path)))
+
+    with tracer.start_span("GET /"):
+        with tracer.start_span("SELECT"):
+            pass
+
+    assert len(path.read_text().splitlines()) == 2
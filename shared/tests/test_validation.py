@@ -0,0 +1,63 @@
+import pytest
+from shared import validation
+
+
+@pytest.mark.parametrize(
+    "email",
+    ["user@example.com", "first.last@sub.example.org", "a+tag@b.co"],
+)
+def test_valid_emails(email):
+    assert validation.is_valid_email(email)
+
+
+@pytest.mark.parametrize(
+    "email",
+    ["invalid-email", "user@example", "user@@example.com", "us er@example.com", ""],
+)
+def test_invalid_emails(email):
+    assert not validation.is_valid_email(email)
+
+
+def test_email_length_limit():
+    email = "a" * validation.EMAIL_MAX_LENGTH + "@example.com"
+    assert not validation.is_valid_email(email)
+
+
+@pytest.mark.parametrize("username", ["testuser", "new_user", "User123"])
+def test_valid_usernames(username):
+    assert validation.is_valid_username(username)
+
+
+@pytest.mark.parametrize("username", ["@testuser", "test user", "user!", ""])
+def test_invalid_usernames(username):
+    assert not validation.is_valid_username(username)
+
+
+def test_username_length_limit():
+    assert not validation.is_valid_username("a" * (validation.USERNAME_MAX_LENGTH + 1))
+
+
+def test_validate_account_ok():
+    assert validation.validate_account("newuser", "new@example.com", "secret") is None
+
+
+def test_validate_account_missing_fields():
+    result = validation.validate_account("newuser", "new@example.com", "")
+    assert result == validation.MISSING_FIELDS
+
+
+def test_validate_account_optional_password():
+    result = validation.validate_account(
+        "newuser", "new@example.com", "", require_password=False
+    )
+    assert result is None
+
+
+def test_validate_account_checks_email_before_username():
+    result = validation.validate_account("@bad", "invalid-email", "secret")
+    assert result == validation.INVALID_EMAIL
+
+
+def test_validate_account_role():
+    result = validation.validate_account("newuser", "new@example.com", "secret", role="root")
+    assert result == validation.INVALID_ROLE
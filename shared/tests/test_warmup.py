@@ -0,0 +1,51 @@
+from shared.warmup import WarmUp
+
+
+def test_ready_after_all_steps():
+    warmup = WarmUp()
+    calls = []
+
+    @warmup.step("first")
+    def first():
+        calls.append("first")
+        return 3
+
+    @warmup.step("second")
+    def second():
+        calls.append("second")
+
+    assert not warmup.ready.is_set()
+    warmup.run()
+
+    assert calls == ["first", "second"]
+    assert warmup.ready.is_set()
+    assert warmup.status()["steps"]["first"]["detail"] == 3
+
+
+def test_optional_step_failure_does_not_block_ready():
+    warmup = WarmUp()
+
+    @warmup.step("cache")
+    def cache():
+        raise RuntimeError("cold")
+
+    warmup.run()
+
+    assert warmup.ready.is_set()
+    assert warmup.results["cache"]["ok"] is False
+
+
+def test_required_step_is_retried():
+    warmup = WarmUp(retry_interval=0)
+    attempts = []
+
+    @warmup.step("database", required=True)
+    def database():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConnectionError("not yet")
+
+    warmup.run()
+
+    assert len(attempts) == 3
+    assert warmup.results["database"]["ok"] is True
@@ -0,0 +1,299 @@
+"""Request tracing compatible with OpenTelemetry / W3C Trace Context.
+
+Spans cover the incoming request, every SQL statement (through
+``shared.db``), template rendering and password hashing. Trace ids are
+taken from an incoming ``traceparent`` header and returned in the
+response's, so a request can be followed across the services and the
+proxy in front of them.
+
+Finished spans are written per request, one JSON object per line, in the
+OTLP field layout (``traceId``, ``spanId``, ``startTimeUnixNano``, ...).
+Set ``TRACE_EXPORTER`` to ``console`` (stdout) or ``file`` (``TRACE_FILE``);
+tracing is off by default and then costs next to nothing.
+"""
+import contextvars
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+
+TRACEPARENT_RE = re.compile(r"00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})")
+
+_current = contextvars.ContextVar("current_span", default=None)
+_tracer = None
+
+
+def parse_traceparent(value):
+    """Return ``(trace_id, parent_span_id, sampled)`` or None if invalid."""
+    match = TRACEPARENT_RE.fullmatch((value or "").strip().lower())
+    if match is None:
+        return None
+    trace_id, span_id, flags = match.groups()
+    if trace_id == "0" * 32 or span_id == "0" * 16:
+        return None
+    return trace_id, span_id, bool(int(flags, 16) & 1)
+
+
+class Span:
+    def __init__(self, tracer, name, trace_id, parent_id, sampled, kind, attributes, root):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = "%016x" % random.getrandbits(64)
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.status = None
+        self.start_ns = None
+        self.end_ns = None
+        # Spans of the same request are exported together with their root
+        self.root = root or self
+        self.finished = []
+        self._token = None
+
+    @property
+    def traceparent(self):
+        return "00-%s-%s-%s" % (self.trace_id, self.span_id, "01" if self.sampled else "00")
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def record_exception(self, e):
+        self.status = {"code": "ERROR", "message": f"{type(e).__name__}: {e}"}
+
+    def start(self):
+        self.start_ns = time.time_ns()
+        return self
+
+    def end(self):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if not self.sampled:
+            return
+        if self.root is self:
+            self.tracer.exporter.export(self.finished + [self])
+            self.finished = []
+        elif self.root.end_ns is None:
+            self.root.finished.append(self)
+        else:
+            # Outlived its root (e.g. a streamed template): export on its own
+            self.tracer.exporter.export([self])
+
+    def __enter__(self):
+        self.start()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.record_exception(exc)
+        _current.reset(self._token)
+        self.end()
+        return False
+
+    def to_dict(self):
+        data = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "durationMs": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "resource": {"service.name": self.tracer.service_name},
+        }
+        if self.status is not None:
+            data["status"] = self.status
+        return data
+
+
+class _NoopSpan:
+    """Returned when tracing is off, so call sites need no checks."""
+
+    traceparent = None
+
+    def set_attribute(self, key, value):
+        pass
+
+    def record_exception(self, e):
+        pass
+
+    def start(self):
+        return self
+
+    def end(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class ConsoleExporter:
+    def __init__(self, stream=None):
+        self.stream = stream
+        self._lock = threading.Lock()
+
+    def export(self, spans):
+        lines = "".join(json.dumps(span.to_dict()) + "\n" for span in spans)
+        with self._lock:
+            stream = self.stream or sys.stdout
+            stream.write(lines)
+            stream.flush()
+
+
+class FileExporter:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans):
+        lines = "".join(json.dumps(span.to_dict()) + "\n" for span in spans)
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(lines)
+
+
+class Tracer:
+    def __init__(self, service_name, exporter, sample_rate=1.0):
+        self.service_name = service_name
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+
+    def start_span(self, name, kind="internal", attributes=None, parent=None):
+        """Create a span (not started) under ``parent``.
+
+        ``parent`` is a span, a ``(trace_id, span_id, sampled)`` tuple from
+        a ``traceparent`` header, or None for the current span.
+        """
+        if parent is None:
+            parent = _current.get()
+        if isinstance(parent, Span):
+            return Span(self, name, parent.trace_id, parent.span_id, parent.sampled,
+                        kind, attributes, parent.root)
+        if parent is not None:
+            trace_id, parent_id, sampled = parent
+        else:
+            trace_id, parent_id = "%032x" % random.getrandbits(128), None
+            sampled = random.random() < self.sample_rate
+        return Span(self, name, trace_id, parent_id, sampled, kind, attributes, None)
+
+
+def configure(service_name, default_path="traces.jsonl"):
+    """Set up the process-wide tracer from the environment; None when off."""
+    global _tracer
+    exporter_name = os.getenv("TRACE_EXPORTER", "none").lower()
+    if exporter_name == "console":
+        exporter = ConsoleExporter()
+    elif exporter_name == "file":
+        exporter = FileExporter(os.getenv("TRACE_FILE", default_path))
+    else:
+        _tracer = None
+        return None
+    sample_rate = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+    _tracer = Tracer(service_name, exporter, sample_rate)
+    return _tracer
+
+
+def set_tracer(tracer):
+    global _tracer
+    _tracer = tracer
+
+
+def span(name, kind="internal", attributes=None):
+    """Context manager for a child of the current span."""
+    if _tracer is None:
+        return NOOP_SPAN
+    return _tracer.start_span(name, kind, attributes)
+
+
+def current_span():
+    return _current.get()
+
+
+def install(app, service_name):
+    """Trace every request and template render of a Flask app.
+
+    The tracer is looked up per request, so tracing can be switched on
+    later with ``configure``/``set_tracer``.
+    """
+    from flask import before_render_template, g, request, template_rendered
+
+    configure(service_name, os.path.join(app.instance_path, "traces.jsonl"))
+
+    def finish(request_span):
+        try:
+            _current.reset(request_span._token)
+        except ValueError:
+            _current.set(None)
+        request_span.end()
+
+    @app.before_request
+    def _trace_request_started():
+        if _tracer is None:
+            return
+        # Never parent to a span left current by an earlier request on this thread
+        _current.set(None)
+        rule = request.url_rule.rule if request.url_rule is not None else request.path
+        request_span = _tracer.start_span(
+            f"{request.method} {rule}",
+            kind="server",
+            attributes={"http.method": request.method, "http.target": request.path},
+            parent=parse_traceparent(request.headers.get("traceparent")),
+        )
+        g.trace_span = request_span.__enter__()
+
+    @app.after_request
+    def _trace_response(response):
+        request_span = g.get("trace_span")
+        if request_span is not None:
+            request_span.set_attribute("http.status_code", response.status_code)
+            response.headers["traceparent"] = request_span.traceparent
+            # Teardown runs before a streamed body is sent; end the span once
+            # the body (and the queries it runs) is done
+            response.call_on_close(lambda: finish(request_span))
+            g.trace_span_closes_with_response = True
+        return response
+
+    @app.teardown_request
+    def _trace_request_finished(exc):
+        request_span = g.pop("trace_span", None)
+        if request_span is None:
+            return
+        if exc is not None:
+            request_span.record_exception(exc)
+        if not g.pop("trace_span_closes_with_response", False):
+            finish(request_span)
+
+    # Render spans are not made current: a streamed template finishes
+    # rendering after the view has returned
+    def _render_started(sender, template, context, **extra):
+        if _tracer is None or "trace_span" not in g:
+            return
+        render_span = _tracer.start_span(
+            f"render {template.name}", attributes={"template.name": template.name}
+        ).start()
+        g.setdefault("trace_renders", []).append(render_span)
+
+    def _render_finished(sender, template, context, **extra):
+        renders = g.get("trace_renders")
+        if renders:
+            renders.pop().end()
+
+    before_render_template.connect(_render_started, app, weak=False)
+    template_rendered.connect(_render_finished, app, weak=False)
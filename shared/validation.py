@@ -0,0 +1,52 @@
+"""Input validation shared by both services.
+
+Patterns are compiled once at import time and every check is pure CPU, so
+callers can reject bad input before paying for a database round trip.
+"""
+import re
+
+# Column sizes from shared/database/init.sql
+USERNAME_MAX_LENGTH = 50
+EMAIL_MAX_LENGTH = 100
+
+ROLES = frozenset({"admin", "user"})
+
+EMAIL_RE = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s]+")
+USERNAME_RE = re.compile(r"[A-Za-z0-9_]+")
+
+# Error codes returned by validate_account; each service maps them to its own messages
+MISSING_FIELDS = "missing_fields"
+INVALID_EMAIL = "invalid_email"
+INVALID_USERNAME = "invalid_username"
+INVALID_ROLE = "invalid_role"
+
+
+def is_valid_email(email):
+    return len(email) <= EMAIL_MAX_LENGTH and EMAIL_RE.fullmatch(email) is not None
+
+
+def is_valid_username(username):
+    return (
+        len(username) <= USERNAME_MAX_LENGTH
+        and USERNAME_RE.fullmatch(username) is not None
+    )
+
+
+def is_valid_role(role):
+    return role in ROLES
+
+
+def validate_account(username, email, password=None, role=None, require_password=True):
+    """Return the first error code for the given fields, or None if they are valid.
+
+    Checks run cheapest first and never touch the database.
+    """
+    if not username or not email or (require_password and not password):
+        return MISSING_FIELDS
+    if not is_valid_email(email):
+        return INVALID_EMAIL
+    if not is_valid_username(username):
+        return INVALID_USERNAME
+    if role is not None and not is_valid_role(role):
+        return INVALID_ROLE
+    return None
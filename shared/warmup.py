@@ -0,0 +1,68 @@
+"""Warm-up phase run before a service reports ready.
+
+Steps run in order in a background thread while the server is already
+accepting connections; ``/readyz`` answers 503 until every required step
+has succeeded, so load balancers only send traffic to a warm instance.
+Required steps that fail (e.g. the database is not up yet) are retried.
+"""
+import threading
+import time
+
+
+class WarmUp:
+    def __init__(self, retry_interval=2.0):
+        self.retry_interval = retry_interval
+        self.steps = []
+        self.results = {}
+        self.ready = threading.Event()
+        self._thread = None
+
+    def step(self, name, required=False):
+        """Decorator registering ``func`` as a warm-up step."""
+
+        def register(func):
+            self.steps.append((name, func, required))
+            return func
+
+        return register
+
+    def _run_step(self, name, func, required):
+        while True:
+            start = time.perf_counter()
+            try:
+                detail = func()
+            except Exception as e:
+                elapsed = time.perf_counter() - start
+                self.results[name] = {"ok": False, "ms": round(elapsed * 1000, 1), "error": str(e)}
+                print(f"Warm-up step {name} failed: {str(e)}")  # Log the error
+                if not required:
+                    return
+                time.sleep(self.retry_interval)
+            else:
+                elapsed = time.perf_counter() - start
+                self.results[name] = {"ok": True, "ms": round(elapsed * 1000, 1), "detail": detail}
+                return
+
+    def run(self):
+        for name, func, required in self.steps:
+            self._run_step(name, func, required)
+        self.ready.set()
+        summary = ", ".join(f"{name}={result['ms']}ms" for name, result in self.results.items())
+        print(f"Warm-up complete: {summary}")
+
+    def start(self):
+        """Run the warm-up in a daemon thread and return immediately."""
+        self._thread = threading.Thread(target=self.run, name="warm-up", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def status(self):
+        return {"ready": self.ready.is_set(), "steps": dict(self.results)}
+
+
+def compile_templates(app):
+    """Load every template so the first requests skip parsing and compilation."""
+    names = app.jinja_env.list_templates()
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
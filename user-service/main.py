@@ -1,12 +1,52 @@
-from flask import Flask, render_template, request, redirect, url_for, session
+from flask import (
+    Flask,
+    Response,
+    make_response,
+    render_template,
+    request,
+    redirect,
+    url_for,
+    session,
+)
 from flask_mysqldb import MySQL
 import MySQLdb.cursors
-import re
-import hashlib
+import math
 import os
+import signal
+import sys
 from dotenv import load_dotenv
 
+# Make the repo-level ``shared`` package importable from a checkout and from the image
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared import (  # noqa: E402
+    accounts,
+    admission,
+    identity_map,
+    outbox,
+    summary,
+    tracing,
+    validation,
+)
+from shared.cache import LRUCache  # noqa: E402
+from shared.circuit_breaker import CircuitOpenError  # noqa: E402
+from shared.activity import LoginActivity  # noqa: E402
+from shared.db import (  # noqa: E402
+    Database,
+    breaker_from_env,
+    configure_timeouts,
+    connection_settings,
+)
+from shared.profiling import RequestProfiler  # noqa: E402
+from shared.startup import StartupProfiler  # noqa: E402
+from shared.templating import enable_bytecode_cache  # noqa: E402
+from shared.warmup import WarmUp, compile_templates  # noqa: E402
+
+# STARTUP_PROFILE=1 prints how long each startup phase took
+startup_profile = StartupProfiler()
+
 app = Flask(__name__)
+enable_bytecode_cache(app)
 
 # Secret key for session management (using environment variable for Docker compatibility)
 # app.config["SECRET_KEY"] = os.environ["SECRET_KEY"]  # NOSONAR
@@ -20,9 +60,127 @@ app.config["MYSQL_USER"] = os.getenv("MYSQL_USER", "root")
 app.config["MYSQL_PASSWORD"] = os.getenv("MYSQL_PASSWORD", "example")
 app.config["MYSQL_DB"] = os.getenv("MYSQL_DB", "pythonlogin")
 
+configure_timeouts(app)
+# TRACE_EXPORTER=console|file turns on request tracing
+tracing.install(app, "user-service")
+# PROFILE_TOKEN / PROFILE_SAMPLE_RATE turn on per-request cProfile captures
+request_profiler = RequestProfiler.from_env(
+    "user-service", os.path.join(app.instance_path, "profiles")
+)
+request_profiler.install(app)
+
+
+def admission_priority(path):
+    # Probes bypass admission; logins go first, profile pages and static files
+    # are shed first
+    if path in ("/healthz", "/readyz", "/metrics"):
+        return None
+    if path == "/login/":
+        return admission.HIGH
+    if path == "/login/profile" or path.startswith("/static/"):
+        return admission.LOW
+    return admission.NORMAL
+
+
+# ADMISSION_LIMIT concurrent requests; the excess waits briefly or gets a 503
+admission_control = admission.install(app, admission_priority)
+startup_profile.mark("config")
+
 # Initialize MySQL
 mysql = MySQL(app)
 
+# Request-time queries go through a circuit breaker so an unhealthy database
+# makes requests fail fast instead of tying up every worker
+db = Database(lambda: mysql.connection, breaker_from_env())
+startup_profile.mark("db_init")
+
+
+def connect_db():
+    # Standalone connection for background threads that run outside a request
+    return MySQLdb.connect(**connection_settings(app))
+
+
+# Accounts loaded at login, reused by later requests of the same session.
+# Entries expire after ACCOUNT_CACHE_TTL seconds so admin edits show up.
+account_cache = LRUCache(
+    maxsize=int(os.getenv("ACCOUNT_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("ACCOUNT_CACHE_TTL", "30")),
+)
+
+
+def forget_accounts(account_ids):
+    # Cached rows predate the flushed logins; reload them from the database
+    for account_id in account_ids:
+        account_cache.discard(account_id)
+
+
+# last_login / login_count, buffered and written in coalesced batches
+login_activity = LoginActivity(
+    connect_db,
+    flush_interval=float(os.getenv("LOGIN_ACTIVITY_FLUSH_SECONDS", "5")),
+    on_flush=forget_accounts,
+)
+
+
+PUBLIC_FIELDS = ("id", "username", "email", "role", "last_login", "login_count")
+
+
+def public_account(row):
+    # Never keep the password hash around
+    return {key: row[key] for key in PUBLIC_FIELDS if key in row}
+
+
+def get_account(account_id):
+    account = identity_map.current().get("accounts", account_id)
+    if account is None:
+        account = account_cache.get(account_id)
+    if account is None:
+        try:
+            row = accounts.get(db.cursor(), account_id)
+        except (CircuitOpenError, MySQLdb.OperationalError):
+            # Database outage: serve the last known copy if there is one
+            account = account_cache.get(account_id, allow_stale=True)
+            if account is None:
+                raise
+        else:
+            if row is None:
+                return None
+            account = public_account(row)
+            account_cache.set(account_id, account)
+    return identity_map.current().add("accounts", account_id, account)
+
+
+@app.errorhandler(CircuitOpenError)
+def database_unavailable(e):
+    response = make_response(
+        render_template(
+            "error.html",
+            message="The service is temporarily unavailable. Please try again shortly.",
+        ),
+        503,
+    )
+    response.headers["Retry-After"] = str(max(1, math.ceil(e.retry_after)))
+    return response
+
+
+@app.route("/healthz")
+def healthz():
+    # Liveness only: no database access, so it answers as soon as the app is up
+    return {"status": "ok"}
+
+
+@app.route("/metrics")
+def metrics():
+    # Admission counters (admitted / shed per priority) for the scraper
+    return Response(admission_control.metrics(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/readyz")
+def readyz():
+    # Readiness: 503 until the warm-up has finished
+    status = warmup.status()
+    return status, 200 if status["ready"] else 503
+
 
 @app.route("/")
 def index():
@@ -41,19 +199,16 @@ def login():
         password = request.form["password"]
 
         # Hash the provided password using SHA1
-        hashed_password = hashlib.sha1(password.encode()).hexdigest()
-
-        cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
-        cursor.execute(
-            "SELECT * FROM accounts WHERE username = %s AND password = %s",
-            (username, hashed_password),
-        )
-        account = cursor.fetchone()
+        hashed_password = accounts.hash_password(password)
+
+        account = accounts.authenticate(db.cursor(), username, hashed_password)
         if account:
             session["loggedin"] = True
             session["id"] = account["id"]
             session["username"] = account["username"]
             session["role"] = account["role"]  # Retrieve role from database
+            account_cache.set(account["id"], public_account(account))
+            login_activity.record(account["id"])
             return redirect(url_for("home"))
         else:
             msg = "Incorrect username/password!"
@@ -62,12 +217,24 @@ def login():
 
 @app.route("/login/logout")
 def logout():
+    if "id" in session:
+        account_cache.discard(session["id"])
     session.pop("loggedin", None)
     session.pop("id", None)
     session.pop("username", None)
     return redirect(url_for("login"))
 
 
+REGISTER_ERRORS = {
+    validation.MISSING_FIELDS: "Please fill out the form!",
+    validation.INVALID_EMAIL: "Invalid email address!",
+    validation.INVALID_USERNAME: (
+        "Username must contain only letters, numbers and underscores "
+        f"(at most {validation.USERNAME_MAX_LENGTH} characters)!"
+    ),
+}
+
+
 @app.route("/login/register", methods=["GET", "POST"])
 def register():
     msg = ""
@@ -82,28 +249,29 @@ def register():
         email = request.form["email"]
         role = "user"  # Default role for all registrations
 
-        cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
-        cursor.execute("SELECT * FROM accounts WHERE username = %s", (username,))
-        account = cursor.fetchone()
-        if account:
-            msg = "Account already exists!"
-        elif not re.match(r"[^@]+@[^@]+\.[^@]+", email):
-            msg = "Invalid email address!"
-        elif not re.match(r"[A-Za-z0-9]+", username):
-            msg = "Username must contain only characters and numbers!"
-        elif not username or not password or not email:
-            msg = "Please fill out the form!"
+        # Reject malformed input before spending a database round trip on it
+        error = validation.validate_account(username, email, password)
+        if error:
+            msg = REGISTER_ERRORS[error]
         else:
-            # Hash the password using SHA1
-            hashed_password = hashlib.sha1(password.encode()).hexdigest()
-
-            # Insert into the database
-            cursor.execute(
-                "INSERT INTO accounts (username, password, email, role) VALUES (%s, %s, %s, %s)",
-                (username, hashed_password, email, role),
-            )
-            mysql.connection.commit()
-            msg = "You have successfully registered!"
+            cursor = db.cursor()
+            if accounts.username_taken(cursor, username):
+                msg = "Account already exists!"
+            else:
+                # Hash the password using SHA1
+                hashed_password = accounts.hash_password(password)
+
+                # Insert into the database, keeping the admin role counts in step
+                account_id = accounts.create(cursor, username, hashed_password, email, role)
+                summary.account_added(cursor, role)
+                outbox.record(
+                    cursor,
+                    outbox.CREATED,
+                    account_id,
+                    {"username": username, "email": email, "role": role},
+                )
+                db.commit()
+                msg = "You have successfully registered!"
     elif request.method == "POST":
         msg = "Please fill out the form!"
     return render_template("register.html", msg=msg)
@@ -119,12 +287,59 @@ def home():
 @app.route("/login/profile")
 def profile():
     if "loggedin" in session:
-        cursor = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
-        cursor.execute("SELECT * FROM accounts WHERE id = %s", (session["id"],))
-        account = cursor.fetchone()
+        # Include logins that are still waiting to be written
+        account = login_activity.overlay(get_account(session["id"]))
         return render_template("profile.html", account=account)
     return redirect(url_for("login"))
 
 
+startup_profile.mark("routes")
+startup_profile.install(app)
+
+
+# Work done before the instance reports ready, so first requests are not slow
+warmup = WarmUp()
+
+
+@warmup.step("database", required=True)
+def warm_database():
+    with app.app_context():
+        cursor = db.cursor()
+        cursor.execute("SELECT 1")
+        cursor.fetchone()
+
+
+@warmup.step("templates")
+def warm_templates():
+    return compile_templates(app)
+
+
+@warmup.step("account_cache")
+def warm_account_cache():
+    # Accounts that logged in most recently are the likeliest to come back.
+    # Primed entries keep the normal ACCOUNT_CACHE_TTL (admin edits must still
+    # show up), so they only cover the burst of requests right after a restart.
+    limit = int(os.getenv("WARMUP_ACCOUNTS", "1000"))
+    if limit <= 0:
+        return 0
+    with app.app_context():
+        rows = accounts.recent(db.cursor(), limit)
+    for row in rows:
+        account_cache.set(row["id"], public_account(row))
+    return len(rows)
+
+
+def shutdown(signum, frame):
+    """SIGTERM handler: flush buffered login activity, then exit.
+
+    As PID 1 in the container the process would otherwise ignore SIGTERM and
+    get killed once the stop timeout runs out, losing the buffered logins.
+    """
+    login_activity.close()
+    sys.exit(0)
+
+
 if __name__ == "__main__":
+    signal.signal(signal.SIGTERM, shutdown)
+    warmup.start()
     app.run(host="0.0.0.0", port=5000, debug=False)
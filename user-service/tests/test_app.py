@@ -1,8 +1,10 @@
 import unittest
 from unittest.mock import patch, MagicMock
-from main import app
-from flask import session
+from main import admission_control, app
+from flask import g, session
 import hashlib
+import signal
+from shared.activity import LoginActivity
 
 
 class FlaskLoginTests(unittest.TestCase):
@@ -31,9 +33,21 @@ class FlaskLoginTests(unittest.TestCase):
         self.mock_connect.return_value = self.mock_connection
         self.mock_connection.cursor.return_value = self.mock_cursor
 
+        # Actividad de login en memoria, sin hilo de escritura real
+        self.activity_patcher = patch(
+            "main.login_activity", LoginActivity(MagicMock(), flush_interval=3600)
+        )
+        self.login_activity = self.activity_patcher.start()
+
+        # Sin límite de concurrencia: el cliente de test no siempre cierra las respuestas
+        self.admission_patcher = patch.object(admission_control, "limit", 0)
+        self.admission_patcher.start()
+
     def tearDown(self):
         self.mysql_patcher.stop()
         self.connect_patcher.stop()
+        self.activity_patcher.stop()
+        self.admission_patcher.stop()
         self.ctx.pop()
 
     def configure_mock_cursor(self, fetchone_return=None, fetchall_return=None):
@@ -46,6 +60,34 @@ class FlaskLoginTests(unittest.TestCase):
         self.assertEqual(response.status_code, 302)
         self.assertIn("/login", response.location)
 
+    def test_healthz(self):
+        response = self.app.get("/healthz")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), {"status": "ok"})
+
+    def test_readyz_waits_for_warm_up(self):
+        from shared.warmup import WarmUp
+
+        with patch("main.warmup", WarmUp()) as warmup:
+            self.assertEqual(self.app.get("/readyz").status_code, 503)
+
+            warmup.run()
+            response = self.app.get("/readyz")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.get_json()["ready"])
+
+    def test_warm_account_cache_primes_recent_accounts(self):
+        from main import account_cache, warm_account_cache
+
+        account_cache.clear()
+        self.mock_cursor.fetchall.return_value = [
+            {"id": 9, "username": "testuser", "email": "test@example.com", "role": "user"}
+        ]
+
+        self.assertEqual(warm_account_cache(), 1)
+        self.assertEqual(account_cache.get(9)["username"], "testuser")
+
     def test_login_get(self):
         response = self.app.get("/login/")
         self.assertEqual(response.status_code, 200)
@@ -73,6 +115,25 @@ class FlaskLoginTests(unittest.TestCase):
             with c.session_transaction() as sess:
                 self.assertEqual(sess["role"], "user")
 
+    def test_login_traces_password_hash_and_query(self):
+        from shared import tracing
+
+        exporter = MagicMock()
+        tracing.set_tracer(tracing.Tracer("user-service", exporter))
+        self.configure_mock_cursor(fetchone_return=None)
+        try:
+            response = self.app.post("/login/", data={"username": "testuser", "password": "testpass"})
+            # The WSGI server closes the response; the test client does not
+            response.close()
+        finally:
+            tracing.set_tracer(None)
+
+        [spans] = exporter.export.call_args[0]
+        names = [span.name for span in spans]
+        self.assertIn("password.hash", names)
+        self.assertIn("SELECT", names)
+        self.assertEqual(names[-1], "POST /login/")
+
     def test_login_post_fail(self):
         self.configure_mock_cursor(fetchone_return=None)
 
@@ -115,10 +176,16 @@ class FlaskLoginTests(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn(b"You have successfully registered!", response.data)
 
-        self.mock_cursor.execute.assert_called_with(
+        self.mock_cursor.execute.assert_any_call(
             "INSERT INTO accounts (username, password, email, role) VALUES (%s, %s, %s, %s)",
             ("newuser", hashed_password, "test@test.com", "user"),
         )
+        # El resumen va casi al final para bloquear su fila el menor tiempo posible;
+        # el evento de alta es la última sentencia antes del commit
+        statements = [c.args[0] for c in self.mock_cursor.execute.call_args_list]
+        self.assertTrue(statements[-2].startswith("INSERT INTO account_summary"))
+        self.assertTrue(statements[-1].startswith("INSERT INTO account_events"))
+        self.mock_connection.commit.assert_called_once()
 
     def test_register_post_existing_account(self):
         self.configure_mock_cursor(
@@ -166,9 +233,22 @@ class FlaskLoginTests(unittest.TestCase):
 
         self.assertEqual(response.status_code, 200)
         self.assertIn(
-            b"Username must contain only characters and numbers!", response.data
+            b"Username must contain only letters, numbers and underscores", response.data
         )
 
+    def test_register_invalid_email_skips_database(self):
+        response = self.app.post(
+            "/login/register",
+            data={
+                "username": "testuser",
+                "password": "testpass",
+                "email": "invalid-email",
+            },
+        )
+
+        self.assertIn(b"Invalid email address!", response.data)
+        self.mock_cursor.execute.assert_not_called()
+
     def test_home_with_session(self):
         with self.app as c:
             with c.session_transaction() as sess:
@@ -198,6 +278,109 @@ class FlaskLoginTests(unittest.TestCase):
             response = c.get("/login/profile")
             self.assertEqual(response.status_code, 200)
 
+    def test_profile_reuses_account_loaded_at_login(self):
+        self.configure_mock_cursor(
+            fetchone_return={
+                "id": 5,
+                "username": "cacheduser",
+                "password": "hash",
+                "email": "cached@test.com",
+                "role": "user",
+            }
+        )
+
+        with self.app as c:
+            c.post("/login/", data={"username": "cacheduser", "password": "pass"})
+            self.mock_cursor.execute.reset_mock()
+
+            response = c.get("/login/profile")
+
+        self.assertIn(b"cached@test.com", response.data)
+        self.mock_cursor.execute.assert_not_called()
+
+    def test_login_activity_is_buffered_and_shown_on_profile(self):
+        self.configure_mock_cursor(
+            fetchone_return={
+                "id": 6,
+                "username": "activeuser",
+                "email": "active@test.com",
+                "role": "user",
+                "last_login": None,
+                "login_count": 2,
+            }
+        )
+
+        with self.app as c:
+            c.post("/login/", data={"username": "activeuser", "password": "pass"})
+            response = c.get("/login/profile")
+
+        # No se escribe en accounts durante el login; el contador incluye el login pendiente
+        statements = [call.args[0] for call in self.mock_cursor.execute.call_args_list]
+        self.assertFalse(any("last_login =" in sql for sql in statements))
+        self.assertIn(b"<td>3</td>", response.data)
+
+    def test_profile_count_does_not_go_back_after_flush(self):
+        from main import forget_accounts
+
+        row = {
+            "id": 9,
+            "username": "steadyuser",
+            "email": "steady@test.com",
+            "role": "user",
+            "last_login": None,
+            "login_count": 4,
+        }
+        self.configure_mock_cursor(fetchone_return=row)
+        self.login_activity.on_flush = forget_accounts
+
+        with self.app as c:
+            c.post("/login/", data={"username": "steadyuser", "password": "pass"})
+            before_flush = c.get("/login/profile")
+
+            # El flush escribe el login; la copia en caché de antes del login se descarta
+            self.mock_cursor.fetchone.return_value = dict(row, login_count=5)
+            self.login_activity.flush()
+            # El contexto de setUp comparte g entre peticiones; en producción cada una tiene el suyo
+            g.pop("identity_map", None)
+            after_flush = c.get("/login/profile")
+
+        self.assertIn(b"<td>5</td>", before_flush.data)
+        self.assertIn(b"<td>5</td>", after_flush.data)
+
+    def test_profile_served_from_cache_during_outage(self):
+        from main import account_cache, db
+        from shared.circuit_breaker import CircuitBreaker
+
+        breaker = CircuitBreaker(min_calls=1, open_seconds=30)
+        breaker.record(0, failed=True)
+        account_cache.set(8, {"id": 8, "username": "offline", "email": "offline@test.com"})
+
+        with patch.object(account_cache, "ttl", 0), patch.object(db, "breaker", breaker):
+            with self.app as c:
+                with c.session_transaction() as sess:
+                    sess["loggedin"] = True
+                    sess["id"] = 8
+                    sess["username"] = "offline"
+
+                response = c.get("/login/profile")
+                login_response = c.post(
+                    "/login/", data={"username": "offline", "password": "pass"}
+                )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"offline@test.com", response.data)
+        self.assertEqual(login_response.status_code, 503)
+        self.assertIn("Retry-After", login_response.headers)
+
+    def test_sigterm_flushes_login_activity(self):
+        from main import shutdown
+
+        # docker stop envía SIGTERM al PID 1: hay que escribir los logins pendientes
+        with patch.object(self.login_activity, "close") as close_activity:
+            with self.assertRaises(SystemExit):
+                shutdown(signal.SIGTERM, None)
+        close_activity.assert_called_once_with()
+
     def test_profile_without_session(self):
         response = self.app.get("/login/profile")
         self.assertEqual(response.status_code, 302)